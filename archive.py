@@ -0,0 +1,152 @@
+import gzip
+import json
+import os
+import re
+import zlib
+from debug import debug, warning
+
+try:
+    import zstandard
+except ImportError:  # Optional: gzip is used without it
+    zstandard = None
+
+# A segment is closed and a new one started once it reaches this size
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+
+SEGMENT_PATTERN = re.compile(r"^segment_(\d+)\.(gz|zst)$")
+
+# Bytes fed to the decompressor at a time while scanning a segment
+SCAN_CHUNK = 64 * 1024
+
+
+def _compress(data, extension):
+    if extension == "zst":
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9)
+
+
+def _decompress(data, extension):
+    if extension == "zst":
+        if zstandard is None:
+            raise RuntimeError("this chat is archived with zstd; install the zstandard package to open it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _read_member(data, offset, extension):
+    """Decompress the record starting at offset; returns (record bytes, compressed length)."""
+    if extension == "zst":
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+    else:
+        decompressor = zlib.decompressobj(wbits=31)  # gzip member
+    parts = []
+    position = offset
+    while not decompressor.eof:
+        chunk = data[position:position + SCAN_CHUNK]
+        if not chunk:
+            raise ValueError("record is cut off")
+        parts.append(decompressor.decompress(chunk))
+        position += len(chunk)
+    return b"".join(parts), position - offset - len(decompressor.unused_data)
+
+
+class ArchiveStore:
+    """
+    Compressed segment files holding chats that haven't been touched for a while.
+
+    Each chat is one independently compressed record (its messages and details
+    as JSON) appended to the current segment file, so reading a chat back only
+    needs its segment, offset and length, which the history index keeps. A
+    segment is a plain concatenation of gzip members (or zstd frames), so
+    `zcat segment_000001.gz` also shows its contents.
+    """
+
+    def __init__(self, directory, compression="gzip", segment_max_bytes=SEGMENT_MAX_BYTES):
+        self.directory = directory
+        if compression == "zstd" and zstandard is None:
+            warning("zstandard is not installed; archiving with gzip")
+            compression = "gzip"
+        self.extension = "zst" if compression == "zstd" else "gz"
+        self.segment_max_bytes = segment_max_bytes
+
+    def _current_segment(self):
+        """The newest segment of the configured format, or a new one when it is full."""
+        os.makedirs(self.directory, exist_ok=True)
+        numbers = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                numbers.append((int(match.group(1)), match.group(2)))
+        if numbers:
+            number, extension = max(numbers)
+            name = f"segment_{number:06d}.{extension}"
+            if extension == self.extension and os.path.getsize(os.path.join(self.directory, name)) < self.segment_max_bytes:
+                return name
+            return f"segment_{number + 1:06d}.{self.extension}"
+        return f"segment_{1:06d}.{self.extension}"
+
+    def append(self, records):
+        """
+        Write records (JSON-serialisable dicts) to the archive, fsynced before returning.
+        Returns (segment, offset, length) for each record, in order.
+        """
+        locations = []
+        segment = self._current_segment()
+        f = open(os.path.join(self.directory, segment), "ab")
+        try:
+            for record in records:
+                if f.tell() >= self.segment_max_bytes:
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+                    segment = self._current_segment()
+                    f = open(os.path.join(self.directory, segment), "ab")
+                data = _compress(json.dumps(record, ensure_ascii=False).encode("utf-8"), self.extension)
+                locations.append((segment, f.tell(), len(data)))
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        debug("Archived %d chats into %s", len(records), segment)
+        return locations
+
+    def scan(self):
+        """
+        Every record in the archive, oldest segment first, as (segment, offset, length, record).
+        Used to list the archived chats again when the history index was lost.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        segments = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                segments.append((int(match.group(1)), name, match.group(2)))
+        for _, name, extension in sorted(segments):
+            if extension == "zst" and zstandard is None:
+                warning("Skipping %s: install the zstandard package to read it", name)
+                continue
+            with open(os.path.join(self.directory, name), "rb") as f:
+                data = memoryview(f.read())
+            offset = 0
+            while offset < len(data):
+                try:
+                    raw, length = _read_member(data, offset, extension)
+                    record = json.loads(raw.decode("utf-8"))
+                except (ValueError, OSError, zlib.error) as e:
+                    # A segment cut short by a crash: the records before it are fine
+                    warning("Unreadable archive data in %s at %d: %s", name, offset, e)
+                    break
+                yield name, offset, length, record
+                offset += length
+
+    def read(self, segment, offset, length):
+        """The record stored at this location."""
+        match = SEGMENT_PATTERN.match(segment)
+        if match is None:
+            raise ValueError(f"not an archive segment: {segment}")
+        with open(os.path.join(self.directory, segment), "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        return json.loads(_decompress(data, match.group(2)).decode("utf-8"))
@@ -0,0 +1,140 @@
+"""
+Headless batch mode: run a file of prompts through the chat engine without the UI.
+
+    python batch.py prompts.jsonl -m llama3 -m mistral -c 4 -o results.jsonl
+
+Every input line is a JSON object with a "prompt" (or just a JSON string). Optional
+keys: "id" (copied to the output), "model" (run on this model only instead of the
+-m models) and "name" (chat name in History). Each prompt runs as a new chat per
+model, saved to history/ like any other chat; one JSON result per line is written
+to the output as soon as it is ready.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from config import Config
+from debug import debug, error, setup_logging, shutdown_logging
+from chat_logic import ChatManager, flush_pending_saves
+from ollama_client import create_client
+from request_executor import RequestExecutor
+
+
+class BatchError(Exception):
+    pass
+
+
+def read_prompts(lines):
+    """Parse the input lines into prompt records, skipping blank lines."""
+    records = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise BatchError(f"line {number}: not valid JSON ({e})")
+        if isinstance(record, str):
+            record = {"prompt": record}
+        if not isinstance(record, dict) or not isinstance(record.get("prompt"), str):
+            raise BatchError(f"line {number}: expected an object with a \"prompt\" string")
+        record.setdefault("id", number)
+        records.append(record)
+    return records
+
+
+async def run_prompt(config, client, executor, record, model):
+    """Send one prompt to one model as a new saved chat; returns the output record."""
+    chat_manager = ChatManager(config.ollama_host, model, config=config, client=client, executor=executor)
+    chat_manager.chat_name = record.get("name") or f"batch {record['id']}"
+    reply = asyncio.get_running_loop().create_future()
+
+    def failed(message):
+        if not reply.done():
+            reply.set_exception(BatchError(message))
+
+    chat_manager.send_user_message(
+        record["prompt"],
+        on_reply_ready=lambda text: reply.done() or reply.set_result(text),
+        on_error=failed,
+        on_cancelled=lambda partial: failed("Generation stopped")
+    )
+    result = {"id": record["id"], "model": model, "prompt": record["prompt"]}
+    try:
+        result["reply"] = await reply
+        result["stats"] = chat_manager.last_reply_stats
+    except BatchError as e:
+        result["error"] = str(e)
+    if chat_manager.current_history_file:
+        result["history_file"] = os.path.basename(chat_manager.current_history_file)
+    return result
+
+
+async def run_batch(config, records, models, concurrency, output):
+    client = create_client(config)
+    executor = RequestExecutor(max_concurrent=concurrency)
+    jobs = [(record, model) for record in records for model in ([record["model"]] if record.get("model") else models)]
+    errors = 0
+    try:
+        tasks = [asyncio.ensure_future(run_prompt(config, client, executor, record, model)) for record, model in jobs]
+        # Results are written in the order they finish
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            if "error" in result:
+                errors += 1
+                error("Prompt %s on %s failed: %s", result["id"], result["model"], result["error"])
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+    finally:
+        executor.shutdown()
+        await client.close()
+        flush_pending_saves()
+    return len(jobs), errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a JSONL file of prompts through SheLLMind without the UI.")
+    parser.add_argument("input", nargs="?", default="-", help="JSONL prompts file ('-' or nothing for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL results file (default: stdout)")
+    parser.add_argument("-m", "--model", action="append", dest="models",
+                        help="model to run every prompt on; repeat for several (default: model_name from config.json)")
+    parser.add_argument("-c", "--concurrency", type=int, default=None,
+                        help="requests sent to Ollama at once (default: max_concurrent_generations)")
+    args = parser.parse_args(argv)
+
+    config = Config()
+    setup_logging(enabled=config.debug_log, level=config.debug_log_level, max_bytes=config.debug_log_max_bytes)
+    models = args.models or [config.model_name]
+    concurrency = args.concurrency or config.max_concurrent_generations
+
+    try:
+        if args.input == "-":
+            records = read_prompts(sys.stdin)
+        else:
+            with open(args.input, "r", encoding="utf-8") as f:
+                records = read_prompts(f)
+    except (OSError, BatchError) as e:
+        print(f"batch: {e}", file=sys.stderr)
+        return 2
+    if not any(models) and not all(r.get("model") for r in records):
+        print("batch: no model given (use -m or set model_name in config.json)", file=sys.stderr)
+        return 2
+
+    started = time.time()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        total, errors = asyncio.run(run_batch(config, records, models, concurrency, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    debug("Batch of %d requests finished in %.1fs", total, time.time() - started)
+    print(f"batch: {total} requests, {errors} failed, {time.time() - started:.1f}s", file=sys.stderr)
+    shutdown_logging()
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+SheLLMind benchmarks: measure the application's own overhead, separately from
+model speed, against a local fake Ollama server (see fake_ollama.py).
+
+    python -m benchmarks.bench                 # full suite
+    python -m benchmarks.bench --quick         # smaller sizes, for a quick check
+    python -m benchmarks.bench --only chat_latency,history_io
+    python -m benchmarks.bench --compare benchmarks/results/<run>.json
+
+Every run is saved to benchmarks/results/<timestamp>.json and compared with the
+previous run (or --compare): metrics ending in _ms should not go up, metrics
+ending in _per_sec should not go down; a change beyond --threshold is reported
+as a regression. All data is written to a temporary folder, never to history/.
+"""
+import argparse
+import asyncio
+import contextlib
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urwid
+
+import chat_logic
+from chat_logic import ChatManager, get_history_index, get_persistence_worker, flush_pending_saves
+from chat_screen import ChatScreen
+from classes.history_menu import HistoryMenu
+from config import Config
+from ollama_client import create_client
+from request_executor import RequestExecutor
+from telemetry import reply_stats
+from benchmarks.fake_ollama import FakeOllama
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# chat_logic module paths pointed at the temporary folder during a benchmark
+_PATHS = ("HISTORY_DIR", "HISTORY_DETAILS_DIR", "HISTORY_INDEX_FILE", "ARCHIVE_DIR", "CACHE_DIR", "RESPONSE_CACHE_FILE")
+_SINGLETONS = ("_history_index", "_persistence_worker", "_response_cache", "_archive_store")
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(fn):
+        BENCHMARKS[name] = fn
+        return fn
+    return register
+
+
+@contextlib.contextmanager
+def bench_environment(**settings):
+    """A Config and chat_logic storage that live in a temporary folder for the duration."""
+    root = tempfile.mkdtemp(prefix="shellmind-bench-")
+    saved = {name: getattr(chat_logic, name) for name in _PATHS + _SINGLETONS}
+    try:
+        history_dir = os.path.join(root, "history")
+        chat_logic.HISTORY_DIR = history_dir
+        chat_logic.HISTORY_DETAILS_DIR = os.path.join(root, "history_details")
+        chat_logic.HISTORY_INDEX_FILE = os.path.join(history_dir, "index.db")
+        chat_logic.ARCHIVE_DIR = os.path.join(history_dir, "archive")
+        chat_logic.CACHE_DIR = os.path.join(root, "cache")
+        chat_logic.RESPONSE_CACHE_FILE = os.path.join(root, "cache", "responses.db")
+        os.makedirs(chat_logic.HISTORY_DIR)
+        os.makedirs(chat_logic.HISTORY_DETAILS_DIR)
+        for name in _SINGLETONS:
+            setattr(chat_logic, name, None)
+
+        config = Config(os.path.join(root, "config.json"))
+        for key, value in dict({"model_name": "bench:1b", "typewriter_speed": 0}, **settings).items():
+            config.set_config(key, value)
+        yield config
+    finally:
+        flush_pending_saves()
+        for name, value in saved.items():
+            setattr(chat_logic, name, value)
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def timed_ms(fn, *args):
+    started = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+@benchmark("chat_latency")
+def bench_chat_latency(quick):
+    """End-to-end ChatManager turns: total time, time to first token and overhead over the server's own time."""
+    turns = 10 if quick else 30
+    server = FakeOllama(tokens_per_sec=500, latency=0.02, reply_tokens=50).start()
+    try:
+        with bench_environment(ollama_host=server.url) as config:
+            totals, first_tokens = [], []
+
+            async def run():
+                client = create_client(config)
+                chat_manager = ChatManager(config.ollama_host, config.model_name, config=config,
+                                           client=client, executor=RequestExecutor())
+                for turn in range(turns):
+                    done = asyncio.get_running_loop().create_future()
+                    first_token = []
+                    started = time.perf_counter()
+                    chat_manager.send_user_message(
+                        f"Question number {turn}?",
+                        on_reply_ready=None,
+                        on_error=lambda message: done.set_exception(RuntimeError(message)),
+                        on_token=lambda text: first_token or first_token.append(time.perf_counter()),
+                        on_stream_done=lambda reply, stats: done.set_result(reply)
+                    )
+                    await done
+                    totals.append(time.perf_counter() - started)
+                    first_tokens.append(first_token[0] - started)
+                await client.close()
+
+            asyncio.run(run())
+    finally:
+        server.stop()
+
+    overheads = [(t - server.expected_time()) * 1000 for t in totals]
+    first_token_overheads = [(t - server.latency) * 1000 for t in first_tokens]
+    return {
+        "turns": turns,
+        "server_ms": server.expected_time() * 1000,
+        "total_p50_ms": percentile(totals, 0.5) * 1000,
+        "total_p95_ms": percentile(totals, 0.95) * 1000,
+        "overhead_p50_ms": percentile(overheads, 0.5),
+        "overhead_p95_ms": percentile(overheads, 0.95),
+        "first_token_overhead_p50_ms": percentile(first_token_overheads, 0.5)
+    }
+
+
+@benchmark("render_stream")
+def bench_render_stream(quick):
+    """ChatScreen streaming a long reply, one redraw per token (the worst case)."""
+    results = {}
+    with bench_environment() as config:
+        for tokens in ((500, 2000) if quick else (1000, 5000)):
+            chat_manager = ChatManager(config.ollama_host, config.model_name, config=config)
+            loop = urwid.MainLoop(urwid.SolidFill(), event_loop=urwid.SelectEventLoop())
+            chat_screen = ChatScreen(loop, chat_manager, config, on_quit=None, call_soon=lambda fn, *args: fn(*args))
+            widget = chat_screen.widget()
+            size = (100, 40)
+            words = [f"word{i % 50} " for i in range(tokens)]
+            started = time.perf_counter()
+            for word in words:
+                chat_screen.on_ai_token(word)
+                widget.render(size, focus=True)
+            chat_screen.on_ai_stream_done("".join(words), reply_stats(time.time(), None, 0, None))
+            widget.render(size, focus=True)
+            elapsed = time.perf_counter() - started
+            chat_screen.stop_status_animation()
+            results[f"tokens_per_sec_{tokens}"] = tokens / elapsed
+            results[f"frame_{tokens}_ms"] = elapsed / tokens * 1000
+    return results
+
+
+@benchmark("history_io")
+def bench_history_io(quick):
+    """save_conversation / load_conversation cost against the number of messages in a chat."""
+    results = {}
+    for size in ((100, 1000) if quick else (100, 1000, 5000)):
+        with bench_environment() as config:
+            worker = get_persistence_worker()
+            chat_manager = ChatManager(config.ollama_host, config.model_name, config=config)
+            chat_manager.conversation_history = [
+                {"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + "text " * 40}
+                for i in range(size)
+            ]
+            results[f"save_full_{size}_ms"] = timed_ms(lambda: (chat_manager.save_conversation(), worker.flush()))
+            chat_manager.conversation_history.append({"role": "user", "content": "one more"})
+            # What the UI thread pays (snapshot and queue), then the whole incremental save
+            results[f"save_queue_{size}_ms"] = timed_ms(chat_manager.save_conversation)
+            worker.flush()
+            chat_manager.conversation_history.append({"role": "assistant", "content": "and a reply"})
+            results[f"save_append_{size}_ms"] = timed_ms(lambda: (chat_manager.save_conversation(), worker.flush()))
+
+            filename = os.path.basename(chat_manager.current_history_file)
+            loader = ChatManager(config.ollama_host, config.model_name, config=config)
+            results[f"load_{size}_ms"] = timed_ms(loader.load_conversation, filename)
+    return results
+
+
+def _write_chats(count):
+    """count small saved chats with details files, with spread out modification times."""
+    now = time.time()
+    for i in range(count):
+        stem = f"chat_{1000000000 + i}"
+        path = os.path.join(chat_logic.HISTORY_DIR, f"{stem}.jsonl")
+        with open(path, "w") as f:
+            f.write(json.dumps({"i": 0, "m": {"role": "user", "content": f"question {i}"}}) + "\n")
+            f.write(json.dumps({"i": 1, "m": {"role": "assistant", "content": f"answer {i}"}}) + "\n")
+        with open(os.path.join(chat_logic.HISTORY_DETAILS_DIR, f"{stem}.json"), "w") as f:
+            json.dump({"model_name": "bench:1b", "name": f"Chat {i}", "create_date": "2024-01-01 00:00:00"}, f)
+        os.utime(path, (now - i, now - i))
+
+
+@benchmark("history_menu")
+def bench_history_menu(quick):
+    """History catalogue build (first start) and HistoryMenu.populate against the number of saved chats."""
+    results = {}
+    for count in ((500, 2000) if quick else (1000, 5000)):
+        with bench_environment():
+            _write_chats(count)
+            results[f"index_build_{count}_ms"] = timed_ms(get_history_index)
+            # Later starts only check the folder against the catalogue
+            chat_logic._history_index = None
+            results[f"index_open_{count}_ms"] = timed_ms(get_history_index)
+            menu = HistoryMenu(on_select_chat=None, on_back=None)
+            results[f"populate_{count}_ms"] = timed_ms(menu.populate, get_history_index())
+            results[f"first_render_{count}_ms"] = timed_ms(lambda: menu.widget().render((100, 40), focus=True))
+    return results
+
+
+@benchmark("startup")
+def bench_startup(quick):
+    """Importing main.py in a fresh interpreter (what runs before the main menu is built)."""
+    code = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+    runs = []
+    for _ in range(3 if quick else 7):
+        output = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(float(output) * 1000)
+    return {"import_main_ms": percentile(runs, 0.5)}
+
+
+def _commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """Print the changes against baseline; returns the regressed metrics."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('created')} ({baseline.get('commit') or 'unknown commit'}):")
+    for name, metrics in current["results"].items():
+        for metric, value in metrics.items():
+            old = baseline.get("results", {}).get(name, {}).get(metric)
+            if not old or value is None:
+                continue
+            change = (value - old) / old
+            if metric.endswith("_ms"):
+                worse = change > threshold
+            elif metric.endswith("_per_sec"):
+                worse = change < -threshold
+            else:
+                continue
+            mark = "  REGRESSION" if worse else ""
+            print(f"  {name}.{metric}: {old:.2f} -> {value:.2f} ({change:+.0%}){mark}")
+            if worse:
+                regressions.append(f"{name}.{metric}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SheLLMind against a fake Ollama server.")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer turns")
+    parser.add_argument("--only", help="comma separated benchmarks: " + ", ".join(BENCHMARKS))
+    parser.add_argument("--compare", help="results file to compare with (default: the previous run)")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change reported as a regression")
+    parser.add_argument("--no-save", action="store_true", help="don't store this run in benchmarks/results")
+    args = parser.parse_args(argv)
+
+    names = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    run = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "quick": args.quick,
+        "results": {}
+    }
+    for name in names:
+        print(f"{name}: {BENCHMARKS[name].__doc__}")
+        metrics = BENCHMARKS[name](args.quick)
+        run["results"][name] = metrics
+        for metric, value in metrics.items():
+            print(f"  {metric}: {value:.2f}" if isinstance(value, float) else f"  {metric}: {value}")
+
+    previous = sorted(glob.glob(os.path.join(RESULTS_DIR, "*.json")))
+    baseline_path = args.compare or (previous[-1] if previous else None)
+    regressions = []
+    if baseline_path:
+        with open(baseline_path, "r") as f:
+            regressions = compare(run, json.load(f), args.threshold)
+
+    if not args.no_save:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+        with open(path, "w") as f:
+            json.dump(run, f, indent=4)
+        print(f"\nResults saved to {path}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Stand-in for the Ollama HTTP API, for benchmarks: replies come at a fixed token
+rate after a fixed latency, so any time beyond that is SheLLMind's own.
+
+    python -m benchmarks.fake_ollama --port 11435 --tokens-per-sec 200 --latency 0.05
+
+Implements /api/tags, /api/ps, /api/version, /api/chat and /api/generate
+(streaming and not). Replies are reply_tokens words of filler text, and the
+final chunk carries Ollama's timing counters. With parallel set, at most that
+many replies are generated at once and the rest wait, like OLLAMA_NUM_PARALLEL.
+"""
+import argparse
+import contextlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor".split()
+
+
+class FakeOllama:
+    """The server and its settings; start() runs it on a background thread."""
+
+    def __init__(self, host="127.0.0.1", port=0, tokens_per_sec=200.0, latency=0.05, reply_tokens=100,
+                 models=("bench:1b", "bench:7b"), parallel=0):
+        self.tokens_per_sec = tokens_per_sec
+        self.latency = latency
+        self.reply_tokens = reply_tokens
+        self.models = list(models)
+        self.parallel = parallel
+        self._slots = threading.BoundedSemaphore(parallel) if parallel else None
+        self.requests = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def expected_time(self, reply_tokens=None):
+        """Time the server itself takes for a reply: latency plus the tokens at the set rate."""
+        tokens = self.reply_tokens if reply_tokens is None else reply_tokens
+        return self.latency + tokens / self.tokens_per_sec
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        """Serve on a background thread; returns self."""
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def slot(self):
+        """Held while a reply is generated; waits for a free slot when parallel is set."""
+        return self._slots if self._slots is not None else contextlib.nullcontext()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Every chunk is a small write; with Nagle's algorithm on, the client's
+            # delayed ACK would add ~40ms to the first token and count as app overhead
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _json(self, data):
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _chunk(self, data):
+                line = (json.dumps(data) + "\n").encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._json({"models": [{"name": m, "model": m} for m in fake.models]})
+                elif self.path == "/api/ps":
+                    self._json({"models": [{"name": m, "model": m} for m in fake.models[:1]]})
+                elif self.path == "/api/version":
+                    self._json({"version": "0.0.0-fake"})
+                else:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                fake.requests += 1
+                chat = self.path == "/api/chat"
+                messages = request.get("messages") or []
+                prompt_chars = sum(len(m.get("content", "")) for m in messages) + len(request.get("prompt") or "")
+                # A generate request without a prompt only loads the model
+                tokens = fake.reply_tokens if (messages or request.get("prompt")) else 0
+                words = [FILLER[i % len(FILLER)] + " " for i in range(tokens)]
+
+                def chunk(text, done):
+                    data = {"model": request.get("model"), "created_at": "2024-01-01T00:00:00Z", "done": done}
+                    if chat:
+                        data["message"] = {"role": "assistant", "content": text}
+                    else:
+                        data["response"] = text
+                    if done:
+                        data.update(
+                            done_reason="stop",
+                            total_duration=int(fake.expected_time(tokens) * 1e9),
+                            load_duration=1000000,
+                            prompt_eval_count=prompt_chars // 4,
+                            prompt_eval_duration=int(fake.latency * 1e9),
+                            eval_count=tokens,
+                            eval_duration=int(tokens / fake.tokens_per_sec * 1e9)
+                        )
+                        if not chat:
+                            data["context"] = [1, 2, 3]
+                    return data
+
+                with fake.slot():
+                    time.sleep(fake.latency)
+                    if not request.get("stream", True):
+                        time.sleep(tokens / fake.tokens_per_sec)
+                        return self._json(chunk("".join(words), True))
+
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    started = time.time()
+                    try:
+                        for i, word in enumerate(words):
+                            # Paced against the start, so sleep overshoot doesn't add up
+                            delay = started + i / fake.tokens_per_sec - time.time()
+                            if delay > 0:
+                                time.sleep(delay)
+                            self._chunk(chunk(word, False))
+                        self._chunk(chunk("", True))
+                        self.wfile.write(b"0\r\n\r\n")
+                        self.wfile.flush()
+                    except (BrokenPipeError, ConnectionResetError):
+                        pass  # The client stopped the reply
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--tokens-per-sec", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--reply-tokens", type=int, default=100)
+    parser.add_argument("--parallel", type=int, default=0, help="replies generated at once (0 = no limit)")
+    args = parser.parse_args()
+    server = FakeOllama(args.host, args.port, args.tokens_per_sec, args.latency, args.reply_tokens,
+                        parallel=args.parallel)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
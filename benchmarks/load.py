@@ -0,0 +1,246 @@
+"""
+Load generator: many simulated users chatting with one Ollama host at once, to
+see how a shared server copes before pointing everyone at it.
+
+    python -m benchmarks.load --sessions 20 --turns 5 --think-time 10
+    python -m benchmarks.load --fake --fake-parallel 4 --sessions 50
+
+Each session is its own ChatManager with its own client, like a separate
+SheLLMind instance: it sends a prompt, waits for the streamed reply, "thinks"
+for a while and sends the next one, with the conversation growing as it goes.
+Prompts are picked at random from --prompts (JSONL as in batch mode, with an
+optional "weight" per line) or from a built-in mix of short and long ones.
+The report has throughput, time to first token and total reply time
+percentiles, and the error rate. Against the real server (ollama_host and
+model_name from config.json, or --host/--model) or, with --fake, against a
+local stand-in. Chats are written to a temporary folder, not to history/.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import random
+import sys
+import time
+
+from batch import BatchError, read_prompts
+from chat_logic import ChatManager
+from config import Config
+from ollama_client import create_client
+from request_executor import RequestExecutor
+from benchmarks.bench import bench_environment, percentile
+from benchmarks.fake_ollama import FakeOllama
+
+DEFAULT_PROMPTS = [
+    {"prompt": "What is the capital of Australia?", "weight": 4},
+    {"prompt": "Give me three name ideas for a hiking club.", "weight": 3},
+    {"prompt": "Explain how DNS resolution works, step by step.", "weight": 2},
+    {"prompt": "Write a Python function that merges overlapping intervals, with a short explanation.", "weight": 2},
+    {"prompt": "Summarize the following text in two sentences:\n\n" + " ".join(
+        ["The committee met on Tuesday to review the budget for the coming year, and after a long "
+         "discussion about maintenance costs it agreed to postpone the new building project."] * 12),
+        "weight": 1},
+]
+
+# Connection settings carried over from config.json when testing a real server
+CONNECTION_SETTINGS = ("request_timeout", "connect_timeout", "request_retries", "retry_backoff",
+                       "generation_timeout", "keep_alive")
+
+THINK_DISTRIBUTIONS = ("fixed", "uniform", "exponential")
+
+
+class LoadResults:
+    """What the sessions measured, collected on the event loop thread."""
+
+    def __init__(self):
+        self.sent = 0
+        self.completed = 0
+        self.tokens = 0
+        self.first_token_times = []
+        self.total_times = []
+        self.errors = collections.Counter()
+
+    @property
+    def failed(self):
+        return sum(self.errors.values())
+
+    def report(self, elapsed):
+        finished = self.completed + self.failed
+        return {
+            "elapsed": elapsed,
+            "requests": self.sent,
+            "completed": self.completed,
+            "failed": self.failed,
+            "error_rate": self.failed / finished if finished else 0.0,
+            "requests_per_sec": self.completed / elapsed if elapsed else 0.0,
+            "tokens_per_sec": self.tokens / elapsed if elapsed else 0.0,
+            "time_to_first_token": {f"p{p}": percentile(self.first_token_times, p / 100) for p in (50, 95, 99)},
+            "total_time": {f"p{p}": percentile(self.total_times, p / 100) for p in (50, 95, 99)},
+            "errors": dict(self.errors.most_common())
+        }
+
+
+def think_time(rng, distribution, mean):
+    if mean <= 0 or distribution == "fixed":
+        return max(0.0, mean)
+    if distribution == "uniform":
+        return rng.uniform(0, 2 * mean)
+    return rng.expovariate(1 / mean)
+
+
+async def send_turn(chat_manager, prompt, results):
+    """One prompt and its streamed reply, timed from the moment it is sent."""
+    done = asyncio.get_running_loop().create_future()
+    first_token = []
+
+    def failed(message):
+        if not done.done():
+            done.set_result(message)
+
+    def finished(reply, stats):
+        results.tokens += (stats or {}).get("eval_count") or 0
+        if not done.done():
+            done.set_result(None)
+
+    results.sent += 1
+    started = time.perf_counter()
+    chat_manager.send_user_message(
+        prompt,
+        on_reply_ready=None,
+        on_error=failed,
+        on_token=lambda text: first_token or first_token.append(time.perf_counter()),
+        on_stream_done=finished
+    )
+    message = await done
+    if message is not None:
+        results.errors[message] += 1
+        return
+    results.completed += 1
+    results.total_times.append(time.perf_counter() - started)
+    if first_token:
+        results.first_token_times.append(first_token[0] - started)
+
+
+async def run_session(number, config, args, prompts, rng, results, deadline):
+    if args.ramp_up:
+        await asyncio.sleep(args.ramp_up * number / args.sessions)
+    client = create_client(config)
+    # Its own client and request slot, like a separate SheLLMind instance
+    chat_manager = ChatManager(config.ollama_host, config.model_name, config=config,
+                               client=client, executor=RequestExecutor(max_concurrent=1))
+    chat_manager.chat_name = f"load session {number}"
+    try:
+        for turn in range(args.turns):
+            if turn:
+                await asyncio.sleep(think_time(rng, args.think_distribution, args.think_time))
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            record = rng.choices(prompts, weights=[r.get("weight", 1) for r in prompts])[0]
+            await send_turn(chat_manager, record["prompt"], results)
+    finally:
+        await client.close()
+
+
+async def report_progress(results, started, interval=5.0):
+    while True:
+        await asyncio.sleep(interval)
+        in_flight = results.sent - results.completed - results.failed
+        print(f"  {time.perf_counter() - started:5.0f}s: {results.sent} sent, {results.completed} done, "
+              f"{results.failed} failed, {in_flight} in flight", file=sys.stderr)
+
+
+async def run_load(config, args, prompts):
+    rng = random.Random(args.seed)
+    results = LoadResults()
+    started = time.perf_counter()
+    deadline = started + args.duration if args.duration else None
+    progress = asyncio.ensure_future(report_progress(results, started))
+    try:
+        await asyncio.gather(*(
+            run_session(number, config, args, prompts, random.Random(rng.random()), results, deadline)
+            for number in range(args.sessions)
+        ))
+    finally:
+        progress.cancel()
+    return results.report(time.perf_counter() - started)
+
+
+def print_report(report, out=sys.stdout):
+    def seconds(values):
+        return ", ".join(f"{name} {value:.2f}s" if value is not None else f"{name} -" for name, value in values.items())
+
+    print(f"Requests:       {report['requests']} sent, {report['completed']} completed, "
+          f"{report['failed']} failed ({report['error_rate']:.1%} errors) in {report['elapsed']:.1f}s", file=out)
+    print(f"Throughput:     {report['requests_per_sec']:.2f} replies/s, {report['tokens_per_sec']:.1f} tokens/s", file=out)
+    print(f"First token:    {seconds(report['time_to_first_token'])}", file=out)
+    print(f"Whole reply:    {seconds(report['total_time'])}", file=out)
+    for message, count in report["errors"].items():
+        print(f"  {count} x {message}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many SheLLMind users on one Ollama host.")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent conversations")
+    parser.add_argument("--turns", type=int, default=5, help="prompts sent by each session")
+    parser.add_argument("--duration", type=float, default=0,
+                        help="stop sending new prompts after this many seconds (0 = run all turns)")
+    parser.add_argument("--think-time", type=float, default=5.0, help="mean seconds between a reply and the next prompt")
+    parser.add_argument("--think-distribution", choices=THINK_DISTRIBUTIONS, default="exponential")
+    parser.add_argument("--ramp-up", type=float, default=0, help="seconds over which the sessions start")
+    parser.add_argument("--prompts", help="JSONL prompts file (batch mode format, optional \"weight\" per line)")
+    parser.add_argument("--host", help="Ollama host (default: ollama_host from config.json)")
+    parser.add_argument("--model", help="model (default: model_name from config.json)")
+    parser.add_argument("--seed", type=int, default=None, help="random seed, to repeat a run")
+    parser.add_argument("--json", help="also write the report to this file")
+    fake = parser.add_argument_group("local stand-in server")
+    fake.add_argument("--fake", action="store_true", help="run against a local fake Ollama instead")
+    fake.add_argument("--fake-tokens-per-sec", type=float, default=50.0)
+    fake.add_argument("--fake-latency", type=float, default=0.2, help="seconds before the first token")
+    fake.add_argument("--fake-reply-tokens", type=int, default=100)
+    fake.add_argument("--fake-parallel", type=int, default=4, help="replies generated at once (0 = no limit)")
+    args = parser.parse_args(argv)
+
+    if args.sessions < 1 or args.turns < 1:
+        parser.error("--sessions and --turns must be at least 1")
+    try:
+        if args.prompts:
+            with open(args.prompts, "r", encoding="utf-8") as f:
+                prompts = read_prompts(f)
+        else:
+            prompts = DEFAULT_PROMPTS
+    except (OSError, BatchError) as e:
+        print(f"load: {e}", file=sys.stderr)
+        return 2
+
+    user_config = Config()
+    settings = {key: getattr(user_config, key) for key in CONNECTION_SETTINGS}
+    server = None
+    if args.fake:
+        server = FakeOllama(tokens_per_sec=args.fake_tokens_per_sec, latency=args.fake_latency,
+                            reply_tokens=args.fake_reply_tokens, parallel=args.fake_parallel).start()
+        settings.update(ollama_host=server.url, model_name=args.model or server.models[0])
+    else:
+        settings.update(ollama_host=args.host or user_config.ollama_host,
+                        model_name=args.model or user_config.model_name)
+    if not settings["model_name"]:
+        print("load: no model given (use --model or set model_name in config.json)", file=sys.stderr)
+        return 2
+
+    print(f"load: {args.sessions} sessions x {args.turns} turns on {settings['model_name']} at "
+          f"{settings['ollama_host']}", file=sys.stderr)
+    try:
+        with bench_environment(**settings) as config:
+            report = asyncio.run(run_load(config, args, prompts))
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(dict(report, settings=vars(args)), f, indent=4)
+    return 0 if report["completed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
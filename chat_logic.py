@@ -1,20 +1,228 @@
-import threading
+import asyncio
 import json
 import os
+import threading
 import time
-from ollama import Client
-from debug import debug
+from ollama_client import OllamaClient
+from debug import debug, error, warning
 from datetime import datetime
+from history_store import HistoryStore, migrate_legacy_history, write_json_atomic
+from persistence import PersistenceWorker
+from archive import ArchiveStore
+from context_window import create_context_strategy, estimate_message_tokens, SUMMARY_PROMPT
+from history_index import HistoryIndex
+from request_executor import RequestExecutor
+from response_cache import ResponseCache, cache_key
+from telemetry import reply_stats, aggregate, SERVER_FIELDS
 
 HISTORY_DIR = os.path.join(os.path.dirname(__file__), "history")
 HISTORY_DETAILS_DIR = os.path.join(os.path.dirname(__file__), "history_details")
 os.makedirs(HISTORY_DIR, exist_ok=True)  # Ensure history folder exists
 os.makedirs(HISTORY_DETAILS_DIR, exist_ok=True) # Ensure history_details folder exists
+HISTORY_INDEX_FILE = os.path.join(HISTORY_DIR, "index.db")
+ARCHIVE_DIR = os.path.join(HISTORY_DIR, "archive")
+# Chats packed into the archive per segment write
+ARCHIVE_BATCH = 200
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
+RESPONSE_CACHE_FILE = os.path.join(CACHE_DIR, "responses.db")
+
+# How often (in seconds) a reply that is still streaming is written to disk
+PARTIAL_SAVE_INTERVAL = 2.0
+
+
+def details_path_for(filename):
+    """Details file for a history file: same chat id, always .json (covers legacy .json and .jsonl histories)."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(HISTORY_DETAILS_DIR, f"{stem}.json")
+
+_history_index = None
+_history_index_lock = threading.Lock()
+
+def get_history_index():
+    """The shared history catalogue, checked against the history folder on first use."""
+    global _history_index
+    # Also reached from the persistence worker thread
+    with _history_index_lock:
+        if _history_index is None:
+            _history_index = HistoryIndex(HISTORY_INDEX_FILE)
+            _history_index.reconcile(ChatManager.list_saved_chats(), HISTORY_DIR, details_path_for)
+            if _history_index.created:
+                rebuild_archive_index(_history_index)
+    return _history_index
+
+
+def rebuild_archive_index(index):
+    """
+    List the archived chats again from the segment files, for a new index.db
+    (deleted, or lost). The newest copy of each chat wins; chats that have a
+    file in history/ again are left to that file.
+    """
+    if not os.path.isdir(ARCHIVE_DIR):
+        return
+    on_disk = {os.path.splitext(f)[0] for f in ChatManager.list_saved_chats()}
+    latest = {}
+    for segment, offset, length, record in get_archive_store().scan():
+        filename = record.get("filename")
+        if filename and os.path.splitext(filename)[0] not in on_disk:
+            latest[os.path.splitext(filename)[0]] = (segment, offset, length, record)
+    chats = []
+    for segment, offset, length, record in latest.values():
+        details = record.get("details") or {}
+        mtime = record.get("mtime") or os.path.getmtime(os.path.join(ARCHIVE_DIR, segment))
+        chats.append((record["filename"], details.get("name", ""), details.get("model_name", ""),
+                      details.get("create_date", ""), mtime, len(record.get("messages", [])),
+                      segment, offset, length))
+    index.add_archived(chats)
+    debug("Listed %d archived chats from the archive segments", len(chats))
+
+
+_persistence_worker = None
+
+def get_persistence_worker():
+    """The shared background writer for chat files (see persistence.PersistenceWorker)."""
+    global _persistence_worker
+    if _persistence_worker is None:
+        _persistence_worker = PersistenceWorker()
+    return _persistence_worker
+
+
+def flush_pending_saves(timeout=10):
+    """Write every queued save to disk; called before the application exits."""
+    if _persistence_worker is not None:
+        _persistence_worker.shutdown(timeout)
+
+
+_response_cache = None
+
+def get_response_cache(config):
+    """The shared on-disk cache of replies (only used with response_cache on)."""
+    global _response_cache
+    if _response_cache is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        _response_cache = ResponseCache(
+            RESPONSE_CACHE_FILE,
+            max_bytes=int(config.response_cache_max_mb * 1024 * 1024),
+            max_age=config.response_cache_max_age
+        )
+    return _response_cache
+
+
+_archive_store = None
+# Held while chats are moved in or out of the archive
+_archive_lock = threading.Lock()
+# Chats opened in this run (by file stem); the archiver leaves them alone
+_open_chats = set()
+
+def get_archive_store(config=None):
+    global _archive_store
+    if _archive_store is None:
+        compression = config.archive_compression if config is not None else "gzip"
+        _archive_store = ArchiveStore(ARCHIVE_DIR, compression=compression)
+    return _archive_store
+
+
+def archive_old_chats(config, on_done=None):
+    """
+    Pack chats not written to for archive_after_days into the compressed archive
+    and delete their files; meant to run in a background thread.
+    """
+    if not config.archive_after_days:
+        return
+    started = time.time()
+    index = get_history_index()
+    store = get_archive_store(config)
+    candidates = index.archive_candidates(time.time() - config.archive_after_days * 86400, limit=-1)
+    archived = 0
+    try:
+        for start in range(0, len(candidates), ARCHIVE_BATCH):
+            with _archive_lock:
+                records = []
+                for filename in candidates[start:start + ARCHIVE_BATCH]:
+                    if os.path.splitext(filename)[0] in _open_chats:
+                        continue
+                    details_file = details_path_for(filename)
+                    try:
+                        details = {}
+                        if os.path.exists(details_file):
+                            with open(details_file, "r") as f:
+                                details = json.load(f)
+                        records.append({"filename": filename, "messages": read_conversation(filename), "details": details,
+                                        "mtime": os.path.getmtime(os.path.join(HISTORY_DIR, filename))})
+                    except (OSError, ValueError) as e:
+                        warning("Could not archive %s: %s", filename, e)
+                if not records:
+                    continue
+                # Segment on disk first, then the index, and only then drop the files
+                locations = store.append(records)
+                index.set_archived([(r["filename"],) + location for r, location in zip(records, locations)])
+                for record in records:
+                    for path in (os.path.join(HISTORY_DIR, record["filename"]), details_path_for(record["filename"])):
+                        if os.path.exists(path):
+                            os.remove(path)
+                archived += len(records)
+    except Exception as e:
+        error("Archiving stopped: %s", e)
+    debug("Archived %d chats in %.2fs", archived, time.time() - started)
+    if on_done:
+        on_done(archived)
+
+
+def restore_archived(filename, store_options=None):
+    """Unpack an archived chat back into history/; returns its (.jsonl) filename. Call with _archive_lock held."""
+    index = get_history_index()
+    location = index.archive_location(filename)
+    if location is None:
+        raise FileNotFoundError(os.path.join(HISTORY_DIR, filename))
+    record = get_archive_store().read(*location)
+    new_filename = os.path.splitext(filename)[0] + ".jsonl"
+    HistoryStore(os.path.join(HISTORY_DIR, new_filename), **(store_options or {})).compact(record["messages"])
+    if record.get("details"):
+        write_json_atomic(details_path_for(new_filename), record["details"])
+    if new_filename != filename:
+        index.rename(filename, new_filename)
+    index.unarchive(new_filename)
+    # Counts as written now, or the next archive pass would pack it up again
+    index.touch(new_filename, len(record["messages"]))
+    debug("Restored %s from the archive", new_filename)
+    return new_filename
+
+
+def read_conversation(filename):
+    """Read a saved conversation without touching it (no migration, no ChatManager)."""
+    path = os.path.join(HISTORY_DIR, filename)
+    if not os.path.exists(path):
+        location = get_history_index().archive_location(filename)
+        if location is not None:
+            return get_archive_store().read(*location)["messages"]
+    if filename.endswith(".jsonl"):
+        return HistoryStore(path).load()
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def backfill_search_index(on_done=None):
+    """Add chats that are not in the search index yet; meant to run in a background thread."""
+    index = get_history_index()
+    filenames = index.unindexed_chats()
+    for filename in filenames:
+        try:
+            index.index_messages(filename, read_conversation(filename))
+        except (OSError, ValueError) as e:
+            warning("Could not index %s for search: %s", filename, e)
+    if on_done:
+        on_done(len(filenames))
+
 
 class ChatManager:
-    def __init__(self, host, model_name):
-        self.client = Client(host=host)
+    def __init__(self, host, model_name, config=None, client=None, executor=None):
+        # Use the application's shared client when given, so no new connection is opened
+        self.client = client if client is not None else OllamaClient(host=host)
+        # Runs the reply requests as tasks on the event loop
+        self.executor = executor if executor is not None else RequestExecutor()
+        self.active_requests = []  # Handles of the replies being generated (several in compare mode)
+        self.compare_contexts = {}  # Context strategy per model used in compare mode
         self.model_name = model_name
+        self.config = config
         self.typing_in_progress = False
         self.conversation_history = []
         # Initialize these attributes so they're always defined
@@ -22,54 +230,453 @@ class ChatManager:
         self.current_reply = None
         self.current_index = 0
         self.current_history_file = None
+        self.history_store = None
+        self.search_indexed = 0  # Messages of this chat already in the search index (updated by the writer)
         self.chat_name = ""  # Add this line to track the chat name
+        self.deleted = False  # Set by delete_chat_files; a reply still being cancelled must not save it again
+        self.last_reply_stats = None  # Timing of the last reply (see telemetry.reply_stats)
+        self.warm_up_task = None  # Background load of the model, see warm_up()
+        # Prompt reuse: the messages sent on the last turn (plus its reply), and with
+        # generate_context on, the server's token context covering the first N messages
+        self.last_prompt = []
+        self.generate_context = None
+        self.generate_context_messages = 0
+        self._pending_generate_context = None
+        # Decides which part of the history is sent with each request
+        self.context = create_context_strategy(config, summarize=self._summarize)
 
-    def list_available_models(self):
-        # Fetch available models from the client. 
+    @staticmethod
+    async def fetch_model_names(client):
+        # Fetch available models from the client (raises on connection errors).
         # Handles cases where models are listed under 'name' or 'model'.
-        try:
-            # Fetch the result from the client
-            result = self.client.list()
-            models_info = result.get("models", [])
-            # Attempt to extract names using 'name'
-            model_names = [m.get("name") for m in models_info if "name" in m]
-            # If no models are found using 'name', fallback to 'model'
-            if not model_names:
-                model_names = [m.get("model") for m in models_info if "model" in m]
-            return model_names
-        except Exception as e:
-            # In case of error, return an empty list
-            return []
+        result = await client.list()
+        models_info = result.get("models", [])
+        # Attempt to extract names using 'name'
+        model_names = [m.get("name") for m in models_info if "name" in m]
+        # If no models are found using 'name', fallback to 'model'
+        if not model_names:
+            model_names = [m.get("model") for m in models_info if "model" in m]
+        return model_names
+
+    @staticmethod
+    async def fetch_running_models(client):
+        # Models loaded in the server's memory right now: {name: expires_at (datetime or None)}
+        result = await client.ps()
+        running = {}
+        for m in result.get("models", []):
+            name = m.get("name") or m.get("model")
+            if name:
+                running[name] = m.get("expires_at")
+        return running
 
-    def send_user_message(self, user_input, on_reply_ready, on_error):
+    def send_user_message(self, user_input, on_reply_ready, on_error, on_token=None, on_stream_done=None,
+                          on_cancelled=None):
+        """
+        Send a user message and fetch the reply in a task on the request executor.
+        The callbacks are called on the event loop thread.
+        If on_token is given the reply is streamed: on_token(text) is called for every
+        chunk and on_stream_done(reply, stats) once generation is finished.
+        Otherwise on_reply_ready(reply) is called with the complete reply.
+        If the request is cancelled, on_cancelled(partial_reply) is called instead
+        (on_error when no on_cancelled is given).
+        """
         self.typing_in_progress = True
         # Append user message to history
         self.conversation_history.append({"role": "user", "content": user_input})
         # Save conversation after user message
         self.save_conversation()
-        threading.Thread(
-            target=self._process_response, 
-            args=(user_input, on_reply_ready, on_error)
-        ).start()
+        on_cancelled = on_cancelled or (lambda partial: on_error("Generation stopped"))
+        key = self._cache_key()
+        if key is not None:
+            cached = get_response_cache(self.config).get(key)
+            if cached is not None:
+                self._cached_reply(cached[0], on_reply_ready, on_stream_done if on_token is not None else None)
+                return
+        if on_token is not None:
+            self.active_requests = [self.executor.submit(
+                "chat", self._stream_response, on_token, on_stream_done, on_error, on_cancelled, key,
+                timeout=self._generation_timeout()
+            )]
+        else:
+            self.active_requests = [self.executor.submit(
+                "chat", self._process_response, on_reply_ready, on_error, on_cancelled, key,
+                timeout=self._generation_timeout()
+            )]
+
+    def _cache_key(self):
+        """Response cache key of the request about to be sent, or None when the cache is off."""
+        if self.config is None or not self.config.response_cache:
+            return None
+        options = {
+            "options": self._chat_options(),
+            "system_prompt": self.config.system_prompt,
+            "context_strategy": self.config.context_strategy
+        }
+        messages = [{"role": m["role"], "content": m.get("content", "")} for m in self._thread_for(self.model_name)]
+        return cache_key(self.model_name, options, messages)
+
+    def _cached_reply(self, reply, on_reply_ready, on_stream_done):
+        # Answer from the cache right away: no slot, no request to the server
+        debug("Reply served from the response cache (%d chars)", len(reply))
+        started = time.time()
+        self.last_reply_stats = reply_stats(started, started, 0, None, self.model_name)
+        self.last_reply_stats["cached"] = True
+        self.conversation_history.append({"role": "assistant", "content": reply, "stats": self.last_reply_stats})
+        self.save_conversation()
+        self.active_requests = []
+        if on_stream_done is not None:
+            self.typing_in_progress = False
+            on_stream_done(reply, self.last_reply_stats)
+        else:
+            on_reply_ready(reply)
+
+    def _store_in_cache(self, key, reply, stats):
+        if key is not None and reply:
+            try:
+                get_response_cache(self.config).put(key, self.model_name, reply, stats)
+            except Exception as e:
+                warning("Could not store the reply in the response cache: %s", e)
+
+    def send_to_models(self, user_input, model_names, on_token, on_done, on_error):
+        """
+        Compare mode: send one user message to several models at once.
+        Every callback gets the model name first: on_token(model, text) for each chunk,
+        on_done(model, reply, stats) when a model finishes, on_error(model, message) when
+        it fails or is stopped. Each reply is added to the history, tagged with its model.
+        """
+        self.typing_in_progress = True
+        self.conversation_history.append({"role": "user", "content": user_input})
+        self.save_conversation()
+        self.active_requests = [
+            self.executor.submit(
+                f"compare {model}", self._compare_response, model, on_token, on_done, on_error,
+                timeout=self._generation_timeout()
+            )
+            for model in model_names
+        ]
+
+    def cancel_generation(self):
+        """Stop the reply (or compared replies) being generated. Returns True if there was one."""
+        running = [r for r in self.active_requests if not r.done() and not r.cancelled]
+        for request in running:
+            request.cancel()  # Interrupts the request wherever it is waiting, even before the first token
+        if running:
+            debug("Generation cancel requested")
+        return bool(running)
+
+    def generation_state(self):
+        """"idle", "queued" (waiting for a free slot) or "generating"."""
+        running = [r for r in self.active_requests if not r.done()]
+        if not running:
+            return "idle"
+        return "generating" if any(r.started for r in running) else "queued"
+
+    def _thread_for(self, model):
+        """
+        The conversation as seen by one model: replies other models gave in
+        compare mode are left out, so every model continues its own thread.
+        """
+        return [m for m in self.conversation_history if m.get("model", model) == model]
 
-    def _process_response(self, user_input, on_reply_ready, on_error):
+    def _generation_timeout(self):
+        if self.config is not None and self.config.generation_timeout:
+            return self.config.generation_timeout
+        return None
+
+    def _keep_alive(self, model):
+        # None lets the server use its own default (5 minutes)
+        if self.config is None:
+            return None
+        return self.config.keep_alive_for(model)
+
+    def warm_up(self, on_done=None):
+        """
+        Load the model in the background with an empty request, so the first
+        reply does not pay the load time. on_done() is called once it is resident.
+        """
+        if self.warm_up_task is not None and not self.warm_up_task.done():
+            return
+        self.warm_up_task = asyncio.ensure_future(self._warm_up(on_done))
+
+    async def _warm_up(self, on_done):
+        started = time.time()
         try:
-            response = self.client.chat(
-                model=self.model_name, 
-                messages=self.conversation_history
+            # A generate request without a prompt only loads the model
+            response = await self.client.generate(model=self.model_name, keep_alive=self._keep_alive(self.model_name))
+            load = (response.get("load_duration") or 0) / 1e9
+            debug("Model %s warmed up in %.2fs (load %.2fs)", self.model_name, time.time() - started, load)
+        except Exception as e:
+            # Not fatal: the first reply will load the model instead
+            warning("Warm-up of %s failed: %s", self.model_name, e)
+            return
+        if on_done:
+            on_done()
+
+    def _chat_options(self):
+        # Tell the server the context size we are budgeting for
+        if self.config is not None and self.config.num_ctx:
+            return {"num_ctx": self.config.num_ctx}
+        return None
+
+    async def _summarize(self, transcript):
+        """Ask the model for a summary of messages that no longer fit in the context window."""
+        response = await self.client.chat(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript}
+            ],
+            options=self._chat_options(),
+            keep_alive=self._keep_alive(self.model_name)
+        )
+        return response["message"]["content"].strip()
+
+    def _use_generate_context(self):
+        # Only when the server context covers every message before the new user message;
+        # otherwise (a stopped reply, compare mode, a resumed chat) the chat endpoint is used
+        if self.config is None or not self.config.generate_context:
+            return False
+        return self.generate_context_messages == len(self.conversation_history) - 1
+
+    async def _open_reply_stream(self):
+        """
+        Start generating the reply to the last user message.
+        Returns (stream, context_tokens, new_tokens): the chunk stream and the estimated
+        size of the prompt, and of the part of it the server has not seen before.
+        """
+        self._pending_generate_context = None
+        if self._use_generate_context():
+            # Only the new message is sent; the earlier turns are in the returned token context
+            user_message = self.conversation_history[-1]
+            system = self.config.system_prompt if not self.generate_context else None
+            stream = await self.client.generate(
+                model=self.model_name,
+                prompt=user_message["content"],
+                system=system or None,
+                context=self.generate_context,
+                options=self._chat_options(),
+                keep_alive=self._keep_alive(self.model_name),
+                stream=True
             )
-            reply = response["message"]["content"]
-            debug(f"AI response received: {reply}")
+            self.last_prompt = []
+            new_tokens = estimate_message_tokens(user_message)
+            return self._generate_chunks(stream), len(self.generate_context or []) + new_tokens, new_tokens
+
+        messages = await self.context.build(self._thread_for(self.model_name))
+        # The server re-evaluates everything after the first message that differs from the last turn
+        reused = 0
+        for sent, previous in zip(messages, self.last_prompt):
+            if sent != previous:
+                break
+            reused += 1
+        self.last_prompt = messages
+        stream = await self.client.chat(
+            model=self.model_name,
+            messages=messages,
+            options=self._chat_options(),
+            keep_alive=self._keep_alive(self.model_name),
+            stream=True
+        )
+        context_tokens = sum(estimate_message_tokens(m) for m in messages)
+        return stream, context_tokens, context_tokens - sum(estimate_message_tokens(m) for m in messages[:reused])
+
+    async def _generate_chunks(self, stream):
+        # Present generate chunks like chat chunks, and keep the context of the final one
+        async for chunk in stream:
+            if chunk.get("done") and chunk.get("context"):
+                self._pending_generate_context = list(chunk["context"])
+            converted = {
+                "message": {"role": "assistant", "content": chunk.get("response") or ""},
+                "done": chunk.get("done")
+            }
+            for field in SERVER_FIELDS:
+                converted[field] = chunk.get(field)
+            yield converted
+
+    def _turn_finished(self, reply, stats, context_tokens, new_tokens):
+        """
+        Called once the reply is in the history: records how much of the prompt
+        was new, and keeps what the next turn needs to reuse this one's prefix.
+        """
+        stats["context_tokens"] = context_tokens
+        stats["new_tokens"] = new_tokens
+        # With the prefix reused, prompt_eval_count should be close to new_tokens, not context_tokens
+        debug("Prompt: %s tokens evaluated by the server, ~%d sent, ~%d new",
+              stats.get("prompt_eval_count"), context_tokens, new_tokens)
+        if self._pending_generate_context is not None:
+            self.generate_context = self._pending_generate_context
+            self.generate_context_messages = len(self.conversation_history)
+            self._pending_generate_context = None
+        else:
+            self.last_prompt = self.last_prompt + [{"role": "assistant", "content": reply}]
+
+    def _stopped(self, request, on_error, on_cancelled, partial_reply):
+        # The request task was cancelled: by the user, or because it ran out of time
+        self.typing_in_progress = False
+        if request.timed_out:
+            warning("Generation stopped after %ss", request.timeout)
+            on_error(f"No complete reply within {request.timeout}s, generation stopped")
+        else:
+            debug("Generation cancelled")
+            on_cancelled(partial_reply)
+
+    async def _process_response(self, request, on_reply_ready, on_error, on_cancelled, cache_key=None):
+        started = time.time()
+        first_token_time = None
+        final_chunk = None
+        parts = []
+        try:
+            async with request:
+                # Streamed under the hood as well, so a cancelled request can be dropped mid-generation
+                stream, context_tokens, new_tokens = await self._open_reply_stream()
+                async for chunk in stream:
+                    if chunk.get("message") and chunk["message"]["content"]:
+                        if first_token_time is None:
+                            first_token_time = time.time()
+                        parts.append(chunk["message"]["content"])
+                    if chunk.get("done"):
+                        final_chunk = chunk
+            reply = "".join(parts)
+            debug("AI response received (%d chars)", len(reply))
+            self.last_reply_stats = reply_stats(started, first_token_time, len(parts), final_chunk, self.model_name)
             # Append assistant response to history
-            self.conversation_history.append({"role": "assistant", "content": reply})
+            self.conversation_history.append({"role": "assistant", "content": reply, "stats": self.last_reply_stats})
+            self._turn_finished(reply, self.last_reply_stats, context_tokens, new_tokens)
             # Save conversation after assistant message
             self.save_conversation()
+            self._store_in_cache(cache_key, reply, self.last_reply_stats)
             on_reply_ready(reply)
+        except asyncio.CancelledError:
+            partial_reply = "".join(parts)
+            if partial_reply:
+                # The part received so far stays in the conversation, as when streaming
+                self.conversation_history.append({"role": "assistant", "content": partial_reply})
+                self.save_conversation()
+            self._stopped(request, on_error, on_cancelled, partial_reply)
         except Exception as e:
-            debug(f"AI error: {e}")
+            error("AI error: %s", e)
             on_error(str(e))
             self.typing_in_progress = False
 
+    async def _stream_response(self, request, on_token, on_stream_done, on_error, on_cancelled, cache_key=None):
+        reply_message = None
+        parts = []
+        started = time.time()
+        first_token_time = None
+        last_save = started
+        final_chunk = None
+        try:
+            async with request:
+                stream, context_tokens, new_tokens = await self._open_reply_stream()
+                async for chunk in stream:
+                    text = chunk["message"]["content"] if chunk.get("message") else ""
+                    if text:
+                        if first_token_time is None:
+                            first_token_time = time.time()
+                            debug("First token after %.2fs", first_token_time - started)
+                            # The reply is part of the history as soon as it starts
+                            reply_message = {"role": "assistant", "content": ""}
+                            self.conversation_history.append(reply_message)
+                        parts.append(text)
+                        on_token(text)
+                        # Persist the partial reply so a crash or error does not lose it
+                        if time.time() - last_save >= PARTIAL_SAVE_INTERVAL:
+                            reply_message["content"] = "".join(parts)
+                            self.save_conversation()
+                            last_save = time.time()
+                    if chunk.get("done"):
+                        final_chunk = chunk
+
+            reply = "".join(parts)
+            if reply_message is None:
+                reply_message = {"role": "assistant", "content": reply}
+                self.conversation_history.append(reply_message)
+            reply_message["content"] = reply
+            self.last_reply_stats = reply_stats(started, first_token_time, len(parts), final_chunk, self.model_name)
+            reply_message["stats"] = self.last_reply_stats
+            self._turn_finished(reply, self.last_reply_stats, context_tokens, new_tokens)
+            self.save_conversation()
+            self._store_in_cache(cache_key, reply, self.last_reply_stats)
+            debug("AI response streamed (%d chars)", len(reply))
+
+            self.typing_in_progress = False
+            if on_stream_done:
+                on_stream_done(reply, self.last_reply_stats)
+        except asyncio.CancelledError:
+            if reply_message is not None:
+                # The partial reply stays in the conversation
+                reply_message["content"] = "".join(parts)
+                self.save_conversation()
+            self._stopped(request, on_error, on_cancelled, "".join(parts))
+        except Exception as e:
+            error("AI error: %s", e)
+            if reply_message is not None:
+                # Keep whatever was generated before the failure
+                reply_message["content"] = "".join(parts)
+                self.save_conversation()
+            self.typing_in_progress = False
+            on_error(str(e))
+
+    async def _compare_response(self, request, model, on_token, on_done, on_error):
+        parts = []
+        started = time.time()
+        first_token_time = None
+        final_chunk = None
+        context = self.compare_contexts.get(model)
+        if context is None:
+            context = create_context_strategy(self.config, summarize=self._summarize)
+            self.compare_contexts[model] = context
+        try:
+            async with request:
+                stream = await self.client.chat(
+                    model=model,
+                    messages=await context.build(self._thread_for(model)),
+                    options=self._chat_options(),
+                    keep_alive=self._keep_alive(model),
+                    stream=True
+                )
+                async for chunk in stream:
+                    text = chunk["message"]["content"] if chunk.get("message") else ""
+                    if text:
+                        if first_token_time is None:
+                            first_token_time = time.time()
+                        parts.append(text)
+                        on_token(model, text)
+                    if chunk.get("done"):
+                        final_chunk = chunk
+            reply = "".join(parts)
+            stats = reply_stats(started, first_token_time, len(parts), final_chunk, model)
+            debug("Compare reply from %s: %d chars in %.2fs", model, len(reply), stats["total_time"])
+            # Replies are only added once complete: the models finish in any order
+            self.conversation_history.append({"role": "assistant", "content": reply, "model": model, "stats": stats})
+            self.save_conversation()
+            on_done(model, reply, stats)
+        except asyncio.CancelledError:
+            if parts:
+                self.conversation_history.append({"role": "assistant", "content": "".join(parts), "model": model})
+                self.save_conversation()
+            if request.timed_out:
+                on_error(model, f"No complete reply within {request.timeout}s, generation stopped")
+            else:
+                on_error(model, "Stopped")
+        except Exception as e:
+            error("AI error from %s: %s", model, e)
+            on_error(model, str(e))
+        finally:
+            if all(r.done() or r is request for r in self.active_requests):
+                self.typing_in_progress = False
+
+    def chat_stats(self):
+        """Aggregated reply stats of this chat, per model (see telemetry.aggregate)."""
+        per_model = {}
+        for message in self.conversation_history:
+            stats = message.get("stats")
+            # Cached replies took no generation time; they would skew the averages
+            if stats and not stats.get("cached"):
+                model = stats.get("model") or message.get("model") or self.model_name
+                per_model.setdefault(model, []).append(stats)
+        return {model: aggregate(stats_list) for model, stats_list in per_model.items()}
+
     def start_typing_effect(self, placeholder, reply):
         self.current_placeholder = placeholder
         self.current_reply = reply
@@ -82,28 +689,87 @@ class ChatManager:
         self.current_reply = None
         self.current_index = 0
 
+    def _store_options(self):
+        if self.config is None:
+            return {}
+        return {
+            "fsync_policy": self.config.history_fsync,
+            "fsync_interval": self.config.history_fsync_interval
+        }
+
     def save_conversation(self):
+        """
+        Queue the conversation for writing. The persistence worker does the disk
+        and index work; a save queued before an earlier one was written replaces it.
+        """
+        if self.deleted:
+            return
         # If no current_history_file is set, create a new one with a timestamp
         if not self.current_history_file:
             timestamp = int(time.time())
-            self.current_history_file = os.path.join(HISTORY_DIR, f"chat_{timestamp}.json")
+            # Several chats can start in the same second (open sessions, batch mode)
+            while os.path.exists(os.path.join(HISTORY_DIR, f"chat_{timestamp}.jsonl")) or \
+                    os.path.exists(os.path.join(HISTORY_DIR, f"chat_{timestamp}.json")):
+                timestamp += 1
+            self.current_history_file = os.path.join(HISTORY_DIR, f"chat_{timestamp}.jsonl")
+            # Claim the name now; the first write may still be queued when the next chat starts
+            open(self.current_history_file, "a").close()
             self.save_conversation_details()
-        with open(self.current_history_file, "w") as f:
-            json.dump(self.conversation_history, f, indent=4)
-            #self.save_conversation_details()
+        if self.history_store is None:
+            self.history_store = HistoryStore(self.current_history_file, **self._store_options())
+        # Snapshot: the worker must not see a reply that is still being streamed into
+        snapshot = [dict(m) for m in self.conversation_history]
+        get_persistence_worker().submit(self.current_history_file, self._write_conversation,
+                                        self.history_store, snapshot)
+
+    def _write_conversation(self, history_store, messages):
+        # Runs on the persistence worker thread
+        # Only the messages added or changed since the last save are appended
+        history_store.sync(messages)
+        index = get_history_index()
+        filename = os.path.basename(history_store.path)
+        index.touch(filename, len(messages))
+        # Search index: the new messages, plus the previous last one in case it grew (streaming)
+        index.index_messages(filename, messages, max(0, self.search_indexed - 1))
+        self.search_indexed = len(messages)
 
     def load_conversation(self, filename):
-        # Load conversation from a file
-        with open(os.path.join(HISTORY_DIR, filename), "r") as f:
-            self.conversation_history = json.load(f)
-        self.current_history_file = os.path.join(HISTORY_DIR, filename)
+        # Load conversation from a file, once any queued write to it has landed
+        get_persistence_worker().flush()
+        with _archive_lock:
+            _open_chats.add(os.path.splitext(filename)[0])
+            if not os.path.exists(os.path.join(HISTORY_DIR, filename)):
+                filename = restore_archived(filename, self._store_options())
+            elif get_history_index().archive_location(filename) is not None:
+                # Archived, but the files were never removed (interrupted): the file wins
+                get_history_index().unarchive(filename)
+        path = os.path.join(HISTORY_DIR, filename)
+        if filename.endswith(".jsonl"):
+            self.history_store = HistoryStore(path, **self._store_options())
+            self.conversation_history = self.history_store.load()
+        else:
+            # Old pretty-printed .json history: convert it to the append-only format
+            self.history_store, self.conversation_history = migrate_legacy_history(path, **self._store_options())
+            get_history_index().rename(filename, os.path.basename(self.history_store.path))
+        self.current_history_file = self.history_store.path
+        self.context.reset()
+        self.compare_contexts = {}
+        self.last_prompt = []
+        self.generate_context = None
+        self.generate_context_messages = 0
+
+        # Chats saved before search existed are indexed the first time they are opened
+        index = get_history_index()
+        filename = os.path.basename(self.current_history_file)
+        if not index.is_search_indexed(filename):
+            index.index_messages(filename, self.conversation_history)
+        self.search_indexed = len(self.conversation_history)
 
     def save_conversation_details(self):
-        if not self.current_history_file:
-            return  # No history file yet, nothing to save
+        if not self.current_history_file or self.deleted:
+            return  # No history file yet (or deleted), nothing to save
         # details filename matches the main history filename but in history_details
-        base_name = os.path.basename(self.current_history_file)
-        details_file = os.path.join(HISTORY_DETAILS_DIR, base_name)
+        details_file = details_path_for(self.current_history_file)
 
         timestamp = int(time.time())
         ctime_str = datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
@@ -114,11 +780,21 @@ class ChatManager:
             "create_date": ctime_str
         }
 
-        with open(details_file, "w") as f:
-            json.dump(details_data, f, indent=4)
+        get_persistence_worker().submit(
+            details_file, self._write_details, details_file, details_data,
+            os.path.basename(self.current_history_file)
+        )
+
+    def _write_details(self, details_file, details_data, filename):
+        # Runs on the persistence worker thread
+        fsync = self.config is None or self.config.history_fsync != "never"
+        write_json_atomic(details_file, details_data, fsync=fsync)
+        get_history_index().update_details(
+            filename, details_data["name"], details_data["model_name"], details_data["create_date"]
+        )
 
     def load_conversation_details(self, filename):
-        details_file = os.path.join(HISTORY_DETAILS_DIR, filename)
+        details_file = details_path_for(filename)
         if os.path.exists(details_file):
             with open(details_file, "r") as f:
                 details_data = json.load(f)
@@ -129,18 +805,29 @@ class ChatManager:
             pass
 
     def delete_chat_files(self):
-        # Delete the main history file and its details file
+        # Delete the main history file and its details file; queued writes must not recreate them
+        if self.current_history_file:
+            worker = get_persistence_worker()
+            worker.discard(self.current_history_file)
+            worker.discard(details_path_for(self.current_history_file))
+            worker.flush()
         if self.current_history_file and os.path.exists(self.current_history_file):
             os.remove(self.current_history_file)
 
         if self.current_history_file:
-            base_name = os.path.basename(self.current_history_file)
-            details_file = os.path.join(HISTORY_DETAILS_DIR, base_name)
+            details_file = details_path_for(self.current_history_file)
             if os.path.exists(details_file):
                 os.remove(details_file)
+            get_history_index().remove(os.path.basename(self.current_history_file))
+        self.history_store = None
+        self.current_history_file = None
+        self.deleted = True
 
     @staticmethod
     def list_saved_chats():
-        # List all .json files in history directory
-        files = [f for f in os.listdir(HISTORY_DIR) if f.endswith(".json")]
+        # List all .jsonl files in history directory, plus legacy .json ones not migrated yet
+        names = os.listdir(HISTORY_DIR)
+        files = [f for f in names if f.endswith(".jsonl")]
+        migrated = {os.path.splitext(f)[0] for f in files}
+        files += [f for f in names if f.endswith(".json") and os.path.splitext(f)[0] not in migrated]
         return files
\ No newline at end of file
@@ -1,21 +1,32 @@
 import urwid
 from debug import debug
 from ui_elements import CustomEdit
+from transcript import TranscriptWalker, ColumnMarkup
+from telemetry import format_stats
 import itertools
 import time
 import re
 
+# The typewriter redraws at most this many times per second
+TYPEWRITER_FPS = 30
+# Characters per second at typewriter_speed 1 (same pace as the old 12 ms per character)
+TYPEWRITER_CHARS_PER_SEC = 1 / (0.1 * 0.12)
+
 class ChatScreen:
-    def __init__(self, loop, chat_manager, config, on_quit):
+    def __init__(self, loop, chat_manager, config, on_quit, call_soon, focus_message=None):
         self.loop = loop
         self.chat_manager = chat_manager
         self.config = config
         self.on_quit = on_quit
+        # Replies arrive in tasks on the event loop; their screen updates go through
+        # call_soon, which wakes the main loop so it redraws once they have run
+        self.call_soon = call_soon
 
         self.status="idle"
         self.default_status="Type your message"
 
-        self.chat_box = urwid.SimpleFocusListWalker([])
+        # Messages are kept as markup; widgets are only built for the visible part
+        self.chat_box = TranscriptWalker()
         self.chat_list = urwid.ListBox(self.chat_box)
 
         chat_list_attr = urwid.AttrMap(self.chat_list, 'normal_content')
@@ -27,10 +38,19 @@ class ChatScreen:
         model_full_name = chat_manager.model_name
         match = re.search(r'[^/]+$', model_full_name)  # Matches the last part after "/"
         model_name = match.group(0) if match else model_full_name
+        self.model_label = model_name
 
         self.chat_linebox = urwid.LineBox(chat_list_attr, title=model_name)
         self.chat_linebox = urwid.AttrMap(self.chat_linebox, 'normal_linebox_border')
 
+        # Compare mode: every message goes to all these models, replies shown in columns
+        self.compare_models = []
+        self.compare_round = []   # Models of the round being generated
+        self.compare_entry = None
+        self.compare_parts = {}
+        self.compare_results = {}
+        self.compare_update_pending = False
+
         input_linebox = urwid.LineBox(input_box_attr, title=self.default_status)
         self.input_linebox = urwid.AttrMap(input_linebox, 'normal_linebox_border')
 
@@ -41,38 +61,83 @@ class ChatScreen:
         self.view.set_focus("footer")
 
         self.input_box.set_message_handler(self.send_message)
-        self.loop.set_alarm_in(0.05, self.periodic_update)
 
         self.is_animating = False  # State to track animation
+        self.animation_alarm = None  # Only scheduled while the title is animating
         self.current_animation_title = ""  # Track current title animation state
 
+        # Streaming state: streamed text is buffered here and drawn
+        # at most once per main loop iteration
+        self.stream_placeholder = None
+        self.stream_parts = []
+        self.stream_update_pending = False
+
+        self.typewriter_alarm = None
+        self.typewriter_started = 0
+
+        # Session state shown in the session bar when several chats are open
+        self.unread = False   # A reply finished while this chat was not on screen
+        self.failed = False   # The last request ended with an error
+        self.on_state_change = None  # Callback(chat_screen), set by the application
+
         # If we have a pre-loaded conversation, display it
-        #message_count = 0
+        entries = []
         for msg in self.chat_manager.conversation_history:
             if msg["role"] == "user":
                 text = [('who', 'You'),": ", ('user_message', msg['content'])]
+            elif "model" in msg:
+                # A reply from compare mode
+                text = [('who', 'AIm'), ('chat_model_style', f" ({msg['model']})"), ": ", ('ai_message', msg['content'])]
             else:
-                text = [('who', 'AIm'),": ", ('ai_message', msg['content'])]
-            self.update_chat(text)
-            #message_count += 1
-            #if message_count % 2 == 0:
-            #    self.chat_box.append(urwid.AttrMap(urwid.Divider("-"), "divider"))
-            #self.chat_box.append(urwid.AttrMap(urwid.Divider("-"), "divider"))
+                text = [self.ai_label(msg.get("stats")), ": ", ('ai_message', msg['content'])]
+            entries.append((text, True))
+        if entries:
+            self.chat_box.extend(entries)
+            if not self.show_message(focus_message):
+                self.chat_list.set_focus(len(self.chat_box) - 1)
+                self.chat_list.set_focus_valign("bottom")
 
         self.update_focus_style()
 
     def widget(self):
         return self.view
 
-    def update_chat(self, new_message, spacer=True):
-        """Safely update the chat and scroll to bottom."""
-        def safe_update(loop, _):
-            if spacer:
-                self.chat_box.append(urwid.AttrMap(urwid.Divider("-"), "divider"))
-            self.chat_box.append(urwid.AttrMap(urwid.Text(new_message), "normal_text"))
-            self.scroll_to_bottom()
+    def show_message(self, position):
+        """Focus the history on a message (e.g. a search result). Returns False if there is no such message."""
+        if position is None or not 0 <= position < len(self.chat_box):
+            return False
+        self.chat_list.set_focus(position)
+        self.chat_list.set_focus_valign("top")
+        self.view.set_focus("body")
+        self.update_focus_style()
+        return True
+
+    def session_label(self):
+        return self.chat_manager.chat_name or self.model_label
+
+    def session_state(self):
+        """State shown in the session bar: "queued", "generating", "error", "unread" or "idle"."""
+        state = self.chat_manager.generation_state()
+        if state != "idle":
+            return state
+        if self.failed:
+            return "error"
+        if self.unread:
+            return "unread"
+        return "idle"
+
+    def set_session_bar(self, session_bar):
+        # Shown above the chat only while more than one chat is open
+        self.view.header = session_bar
+
+    def _state_changed(self):
+        if self.on_state_change is not None:
+            self.on_state_change(self)
 
-        self.loop.set_alarm_in(0, safe_update)
+    def update_chat(self, new_message, spacer=True):
+        """Add a message to the chat and scroll to bottom (main loop only)."""
+        self.chat_box.append(new_message, spacer)
+        self.scroll_to_bottom()
 
     def update_status(self, new_status):
         """Update the LineBox title only if it has changed."""
@@ -80,7 +145,6 @@ class ChatScreen:
         if getattr(self, "_current_title", None) != new_status:
             self._current_title = new_status  # Store the new title
             self.input_linebox.original_widget.set_title(new_status)
-            debug(f"Title updated to: {new_status}")
 
     def start_status_animation(self, base_status):
         """Start animating the chat title if not already active."""
@@ -94,7 +158,7 @@ class ChatScreen:
         else:
             self.loader = itertools.cycle([" |", " /", " -", " \\"])  # Infinite spinner
 
-        self.loop.set_alarm_in(0.1, self.animate_status)
+        self.animation_alarm = self.loop.set_alarm_in(0.1, self.animate_status)
 
     def animate_status(self, loop=None, user_data=None):
         """Animate the chat title with a spinner."""
@@ -107,10 +171,9 @@ class ChatScreen:
         # Update only if the title has actually changed
         if new_status != self.default_status:
             self.update_status(new_status)
-            debug(f"Chat status updated to: {new_status}")
 
         # Schedule the next update
-        self.loop.set_alarm_in(0.1, self.animate_status)
+        self.animation_alarm = self.loop.set_alarm_in(0.1, self.animate_status)
 
     def stop_status_animation(self):
         """Stop the status animation and reset the title."""
@@ -118,23 +181,21 @@ class ChatScreen:
             return  # Avoid redundant calls
         self.status="idle"
         self.is_animating = False
+        if self.animation_alarm is not None:
+            self.loop.remove_alarm(self.animation_alarm)
+            self.animation_alarm = None
         self.update_status(self.default_status)
         debug("Status animation stopped.")
 
     def scroll_to_bottom(self):
+        # Called for every redraw of a reply, so it stays quiet in the log
         if self.view.focus_part != "footer":
-            debug("Skipping scroll to bottom since history is in focus.")
-            return
+            return  # History is in focus: leave the viewport where the user put it
 
-        debug(f"Scroll Request: len(chat_box)={len(self.chat_box)}")
         if len(self.chat_box) > 0:
             self.chat_list.set_focus(len(self.chat_box) - 1)
-            debug("Focus set to last widget in chat_list.")
             self.chat_list.set_focus_valign("bottom")
-            debug("Viewport aligned to bottom.")
-
-        self.loop.draw_screen()
-        debug("UI redrawn after scroll adjustment.")
+        # No explicit redraw: the main loop redraws once it has handled the pending events
 
     def send_message(self):
         if self.chat_manager.typing_in_progress:
@@ -147,93 +208,277 @@ class ChatScreen:
         self.update_chat([('who', 'You'),": ", ('user_message', user_input)])
         
         self.input_box.set_edit_text("")
+        self.unread = False
+        self.failed = False
         self.status="sent"
         self.start_status_animation("AIm is Thinking")
-        debug(f"User message sent: {user_input}")
+        debug("User message sent (%d chars)", len(user_input))
 
         if user_input.lower() == "exit":
             self.update_chat("AIm: Goodbye!", spacer=False)
-            raise self.on_quit()
+            self.on_quit()
+            return
 
-        self.chat_manager.send_user_message(
-            user_input,
-            on_reply_ready=self.on_ai_reply_ready,
-            on_error=self.on_ai_error
+        if self.compare_models:
+            self.start_compare(user_input)
+        elif self.config.stream_replies:
+            self.chat_manager.send_user_message(
+                user_input,
+                on_reply_ready=self.on_ai_reply_ready,
+                on_error=self.on_ai_error,
+                on_token=self.on_ai_token,
+                on_stream_done=self.on_ai_stream_done,
+                on_cancelled=self.on_ai_cancelled
+            )
+        else:
+            self.chat_manager.send_user_message(
+                user_input,
+                on_reply_ready=self.on_ai_reply_ready,
+                on_error=self.on_ai_error,
+                on_cancelled=self.on_ai_cancelled
+            )
+
+    def set_compare_models(self, models):
+        """Turn compare mode on for these models (off when fewer than two are given)."""
+        self.compare_models = list(models) if len(models) > 1 else []
+        title = f"Compare: {', '.join(self.compare_models)}" if self.compare_models else self.model_label
+        self.chat_linebox.original_widget.set_title(title)
+
+    def _compare_column(self, model, text, footer=None):
+        markup = [('chat_model_style', model), "\n", ('ai_message', text)]
+        if footer:
+            markup += ["\n\n", ('who', footer)]
+        return markup
+
+    def start_compare(self, user_input):
+        """Fan the message out to every compared model; their replies stream into one row of columns."""
+        self.compare_round = list(self.compare_models)
+        self.compare_parts = {model: [] for model in self.compare_round}
+        self.compare_results = {}
+        self.compare_entry = self.chat_box.append(
+            ColumnMarkup([self._compare_column(model, "...") for model in self.compare_round])
+        )
+        self.scroll_to_bottom()
+        self.chat_manager.send_to_models(
+            user_input, self.compare_round,
+            on_token=self.on_compare_token,
+            on_done=self.on_compare_done,
+            on_error=self.on_compare_error
         )
 
+    def on_compare_token(self, model, text):
+        self.compare_parts[model].append(text)
+        if self.compare_update_pending:
+            return
+        self.compare_update_pending = True
+        self.call_soon(self._flush_compare)
+
+    def _flush_compare(self):
+        self.compare_update_pending = False
+        if self.status == "sent":
+            # First reply started: switch from "Thinking" to "Typing"
+            self.stop_status_animation()
+            self.status = "type"
+            self.start_status_animation("AIm is Typing")
+        for column, model in enumerate(self.compare_round):
+            if model not in self.compare_results:
+                self.compare_entry.set_column(column, self._compare_column(model, "".join(self.compare_parts[model])))
+        self.scroll_to_bottom()
+
+    def on_compare_done(self, model, reply, stats):
+        self._compare_finished(model, reply, format_stats(stats), stats)
+
+    def on_compare_error(self, model, error_msg):
+        self._compare_finished(model, "".join(self.compare_parts[model]), f"Error: {error_msg}", None)
+
+    def _compare_finished(self, model, reply, footer, stats):
+        def safe_update():
+            self.compare_results[model] = stats
+            column = self.compare_round.index(model)
+            self.compare_entry.set_column(column, self._compare_column(model, reply, footer))
+            if len(self.compare_results) == len(self.compare_round):
+                self.stop_status_animation()
+                self.update_status(self.format_compare_summary())
+                self.unread = True
+                self._state_changed()
+            self.scroll_to_bottom()
+
+        self.call_soon(safe_update)
+
+    def format_compare_summary(self):
+        """Input box title after a compare round: the models ranked by tokens per second."""
+        speeds = [(stats["tokens_per_sec"], model) for model, stats in self.compare_results.items()
+                  if stats and stats.get("tokens_per_sec")]
+        if not speeds:
+            return self.default_status
+        ranking = ", ".join(f"{model} {speed:.1f} tok/s" for speed, model in sorted(speeds, reverse=True))
+        return f"{self.default_status} | {ranking}"
+
+    def abort_generation(self):
+        """Stop the reply that is being generated (bound to ctrl+k)."""
+        if self.chat_manager.cancel_generation():
+            self.stop_status_animation()
+            self.update_status(f"{self.default_status} | Stopping...")
+
     def on_ai_reply_ready(self, reply):
         """Handle when the AI reply is ready to process."""
-        self.stop_status_animation()
-        self.status="type"
-        self.start_status_animation("AIm is Typing")
-        placeholder = self.add_placeholder()
-        self.chat_manager.start_typing_effect(placeholder, reply)
+        def safe_update():
+            self.stop_status_animation()
+            self.status="type"
+            self.start_status_animation("AIm is Typing")
+            placeholder = self.add_placeholder()
+            self.chat_manager.start_typing_effect(placeholder, reply)
+            self.start_typewriter()
+
+        self.call_soon(safe_update)
+
+    def on_ai_token(self, text):
+        """Buffer a streamed chunk and schedule a single redraw for it."""
+        self.stream_parts.append(text)
+        if self.stream_update_pending:
+            return  # A redraw is already scheduled and will pick this chunk up
+        self.stream_update_pending = True
+        self.call_soon(self._flush_stream)
+
+    def _flush_stream(self):
+        """Draw everything streamed so far into the reply placeholder."""
+        self.stream_update_pending = False
+        current_text = "".join(self.stream_parts)
+        self.stream_parts = [current_text] if current_text else []
+        if not current_text:
+            return
+
+        if self.stream_placeholder is None:
+            # First chunk: switch from "Thinking" to "Typing"
+            self.stop_status_animation()
+            self.status = "type"
+            self.start_status_animation("AIm is Typing")
+            self.stream_placeholder = self.add_placeholder()
+
+        self.stream_placeholder.set_text([('who', 'AIm'), ": ", ('ai_message', current_text)])
+        self.scroll_to_bottom()
+
+    def on_ai_stream_done(self, reply, stats):
+        """Show the complete streamed reply and its timing once generation ends."""
+        def safe_update():
+            self.stream_parts = []
+            if self.stream_placeholder is None:
+                self.stream_placeholder = self.add_placeholder()
+            self.stream_placeholder.set_text([self.ai_label(stats), ": ", ('ai_message', reply)])
+            self.stream_placeholder = None
+            self.stop_status_animation()
+            self.update_status(self.format_reply_stats(stats))
+            self.scroll_to_bottom()
+            self.unread = True
+            self._state_changed()
+
+        self.call_soon(safe_update)
+
+    def ai_label(self, stats):
+        """Name shown before a reply; replies answered from the response cache are marked."""
+        if stats and stats.get("cached"):
+            return [('who', 'AIm'), ('chat_model_style', " [cached]")]
+        return ('who', 'AIm')
+
+    def format_reply_stats(self, stats):
+        """Build the input box title shown after a reply."""
+        if not stats:
+            return self.default_status
+        return f"{self.default_status} | {format_stats(stats)}"
+
+    def on_ai_cancelled(self, partial_reply):
+        """Leave whatever was generated before the reply was stopped on screen."""
+        def safe_update():
+            self.stream_parts = []
+            if self.stream_placeholder is not None:
+                self.stream_placeholder.set_text(
+                    [('who', 'AIm'), ": ", ('ai_message', partial_reply), " [stopped]"]
+                )
+                self.stream_placeholder = None
+            elif partial_reply:
+                # Not streamed: the part received so far was never shown
+                self.update_chat([('who', 'AIm'), ": ", ('ai_message', partial_reply), " [stopped]"])
+            self.stop_status_animation()
+            self.update_status(f"{self.default_status} | Reply stopped")
+            self.scroll_to_bottom()
+            self._state_changed()
+
+        self.call_soon(safe_update)
 
     def on_ai_error(self, error_msg):
-        """Handle AI errors safely by scheduling the update in the main loop."""
-        def safe_update(loop, _):
+        """Handle AI errors safely by handing the update to the main loop."""
+        def safe_update():
+            self.stream_parts = []
+            self.stream_placeholder = None
             self.update_chat(f"AIm: Error: {error_msg}")
             self.stop_status_animation()
+            self.failed = True
+            self._state_changed()
 
-        self.loop.set_alarm_in(0, safe_update)
+        self.call_soon(safe_update)
 
     def add_placeholder(self):
-        self.chat_box.append(urwid.AttrMap(urwid.Divider("-"), "divider"))
-        placeholder = urwid.Text("")
-        self.chat_box.append(placeholder)
+        # The returned entry handle is updated with set_text() as the reply arrives
+        placeholder = self.chat_box.append("")
         self.scroll_to_bottom()
         return placeholder
 
-    def periodic_update(self, loop, _):
-        if self.chat_manager.typing_in_progress:
-            self.typewriter_effect(loop, None)
-        else:
-            self.stop_status_animation()
-        loop.set_alarm_in(0.05, self.periodic_update)
-
+    def start_typewriter(self):
+        """Start revealing chat_manager.current_reply in its placeholder."""
+        self.typewriter_started = time.time()
+        self.typewriter_alarm = self.loop.set_alarm_in(0, self.typewriter_effect)
 
     def typewriter_effect(self, loop, user_data):
-        """Non-blocking typewriter effect using time checks."""
-        if self.chat_manager.current_placeholder is None or self.chat_manager.current_reply is None:
+        """
+        Reveal the reply frame by frame: each frame shows however many characters
+        the elapsed time allows at the configured speed, with one redraw per frame.
+        """
+        reply = self.chat_manager.current_reply
+        placeholder = self.chat_manager.current_placeholder
+        if placeholder is None or reply is None:
+            self.typewriter_alarm = None
             return
 
-        # Initialize or retrieve the last update time
-        if not hasattr(self, 'last_type_time'):
-            self.last_type_time = time.time()
-
-        # Delay calculation: 1 (moderate) to 10 (nearly instant)
-        # Bias allows customization for overall speed adjustments
-        BIAS = 0.12  # Adjust this value: lower = faster overall, higher = slower
-
+        # Speed 1 (moderate) to 10 (nearly instant); 0 disables the effect
         speed = self.config.typewriter_speed
-        delay = max(0.001, (0.1 / speed) * BIAS)  # Ensure a minimum delay of 1ms
-
-        # Check elapsed time
-        if time.time() - self.last_type_time >= delay:
-            self.last_type_time = time.time()  # Reset timer
+        if speed > 0:
+            target = int((time.time() - self.typewriter_started) * speed * TYPEWRITER_CHARS_PER_SEC)
+        else:
+            target = len(reply)
 
-            if self.chat_manager.current_index < len(self.chat_manager.current_reply):
-                # Construct the current message
-                current_message = self.chat_manager.current_reply[: self.chat_manager.current_index + 1]
-                full_text = [('who', 'AIm'), ": ", ('ai_message', current_message)]
+        if target >= len(reply):
+            self.finish_typewriter()
+            return
 
-                # Update placeholder text
-                self.chat_manager.current_placeholder.set_text(full_text)
-                self.chat_manager.current_index += 1
-                self.scroll_to_bottom()
+        if target > self.chat_manager.current_index:
+            self.chat_manager.current_index = target
+            placeholder.set_text([('who', 'AIm'), ": ", ('ai_message', reply[:target])])
+            self.scroll_to_bottom()
 
-                # Reschedule without blocking
-                self.loop.set_alarm_in(0, self.typewriter_effect)
-            else:
-                # Typing complete: display full message
-                full_text = [('who', 'AIm'), ": ", ('ai_message', self.chat_manager.current_reply)]
-                self.chat_manager.current_placeholder.set_text(full_text)
-                self.chat_manager.stop_typing_effect()
-                self.scroll_to_bottom()
-                self.stop_status_animation()
+        # Reschedule without blocking
+        self.typewriter_alarm = self.loop.set_alarm_in(1 / TYPEWRITER_FPS, self.typewriter_effect)
+
+    def finish_typewriter(self):
+        """Typing complete: display full message."""
+        if self.typewriter_alarm is not None:
+            self.loop.remove_alarm(self.typewriter_alarm)
+            self.typewriter_alarm = None
+        full_text = [self.ai_label(self.chat_manager.last_reply_stats), ": ",
+                     ('ai_message', self.chat_manager.current_reply)]
+        self.chat_manager.current_placeholder.set_text(full_text)
+        self.chat_manager.stop_typing_effect()
+        self.scroll_to_bottom()
+        self.stop_status_animation()
+        self.update_status(self.format_reply_stats(self.chat_manager.last_reply_stats))
+        self.unread = True
+        self._state_changed()
 
-                # Clean up the timer
-                del self.last_type_time
+    def flush_typewriter(self):
+        """Show the rest of the reply at once. Returns True if a reply was being typed."""
+        if self.chat_manager.current_placeholder is None or self.chat_manager.current_reply is None:
+            return False
+        self.finish_typewriter()
+        return True
 
     def update_focus_style(self):
         """Update border styles based on focus."""
@@ -0,0 +1,55 @@
+import urwid
+
+class CompareMenu:
+    def __init__(self, models, selected, on_done, on_back, loading=False):
+        """
+        :param models: Model names to choose from.
+        :param selected: Models currently compared in the chat.
+        :param on_done: Callback(list_of_models); fewer than two models turns compare mode off.
+        :param on_back: Callback to return to the chat unchanged.
+        """
+        self.on_done = on_done
+        self.on_back = on_back
+        self.selected = set(selected)
+
+        self.list_walker = urwid.SimpleFocusListWalker([])
+        list_box = urwid.ListBox(self.list_walker)
+        line_box = urwid.LineBox(list_box, title="Compare Models")
+        self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
+        self.set_models(models, loading)
+
+    def set_models(self, models, loading=False):
+        """Rebuild the check boxes, keeping the models already ticked."""
+        self.checkboxes = []
+        items = [urwid.Text("Tick the models that get every message, side by side:\n")]
+        if not models:
+            items.append(urwid.Text("Loading models..." if loading else "No models found."))
+        for m in models:
+            checkbox = urwid.CheckBox(('menu_voice', m), state=m in self.selected,
+                                      on_state_change=self._on_toggle, user_data=m)
+            self.checkboxes.append(checkbox)
+            items.append(checkbox)
+
+        items.append(urwid.Divider())
+        items.append(urwid.Button(('menu_voice', "Compare selected models"), on_press=lambda button: self._done()))
+        items.append(urwid.Button(('menu_voice', "Stop comparing"), on_press=lambda button: self.on_done([])))
+        items.append(urwid.Button(('normal_content', "Back"), on_press=lambda button: self.on_back()))
+        self.list_walker[:] = items
+        self.list_walker.set_focus(1 if models else len(items) - 1)
+
+    def _on_toggle(self, checkbox, state, model):
+        if state:
+            self.selected.add(model)
+        else:
+            self.selected.discard(model)
+
+    def _done(self):
+        # Keep the order of the list
+        self.on_done([c.get_label() for c in self.checkboxes if c.get_state()])
+
+    def widget(self):
+        return self.view
+
+    def handle_input(self, key):
+        if key == 'esc':
+            self.on_back()
@@ -2,7 +2,7 @@ import urwid
 import re
 import os
 from themes_manager import Themes
-from debug import debug
+from debug import debug, warning
 import json
 
 class ThemeSelectionMenu:
@@ -86,7 +86,7 @@ class ThemeSelectionMenu:
 
         for filename in os.listdir(self.themes_directory):
             if filename.endswith(".json"):
-                debug(f"Attempting to load theme file: {filename}")
+                debug("Attempting to load theme file: %s", filename)
                 try:
                     with open(os.path.join(self.themes_directory, filename), "r") as file:
                         theme_data = json.load(file)
@@ -97,7 +97,7 @@ class ThemeSelectionMenu:
                             "filename": filename.split(".")[0]
                         })
                 except Exception as e:
-                    debug(f"Error loading theme {filename}: {e}")
+                    warning("Error loading theme %s: %s", filename, e)
         return themes
 
     def _theme_chosen(self, button, theme_filename):
@@ -122,30 +122,46 @@ class ThemeSelectionMenu:
 
 
 class ModelSelectionMenu:
-    def __init__(self, models, on_select, on_back):
+    def __init__(self, models, on_select, on_back, loading=False):
         self.on_select = on_select
         self.on_back = on_back
 
+        # The list contents are replaced in place when a fresh model list arrives
+        self.list_walker = urwid.SimpleFocusListWalker([])
+        list_box = urwid.ListBox(self.list_walker)
+        line_box = urwid.LineBox(list_box, title="Select a Model")
+        self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
+        self.set_models(models, loading)
+
+    def set_models(self, models, loading=False):
+        """Rebuild the model buttons, keeping the focus on the same model if it is still listed."""
+        focused_model = None
+        if self.list_walker:
+            focused_model = getattr(self.list_walker.get_focus()[0], "model_name", None)
+
+        buttons = []
         if not models:
-            text = urwid.Text("No models found.\nPress 'b' to go back.")
-            self.view = urwid.LineBox(urwid.Filler(text), title="Select a Model")
+            if loading:
+                buttons.append(urwid.Text("Loading models..."))
+            else:
+                buttons.append(urwid.Text("No models found.\nPress 'esc' to go back."))
+        for m in models:
+            btn = urwid.Button(('menu_voice',m))
+            btn.model_name = m
+            urwid.connect_signal(btn, 'click', self._model_chosen, m)
+            buttons.append(btn)
+
+        back_btn = urwid.Button(('normal_content',"Back"))
+        urwid.connect_signal(back_btn, 'click', lambda button: self.on_back())
+        buttons.append(back_btn)
+
+        self.list_walker[:] = buttons
+        for position, btn in enumerate(buttons):
+            if focused_model is not None and getattr(btn, "model_name", None) == focused_model:
+                self.list_walker.set_focus(position)
+                break
         else:
-            buttons = []
-            for m in models:
-                btn = urwid.Button(('menu_voice',m))
-                urwid.connect_signal(btn, 'click', self._model_chosen, m)
-                buttons.append(btn)
-
-            back_btn = urwid.Button(('normal_content',"Back"))
-            urwid.connect_signal(back_btn, 'click', lambda button: self.on_back())
-            buttons.append(back_btn)
-
-            list_walker = urwid.SimpleFocusListWalker(buttons)
-            list_box = urwid.ListBox(list_walker)
-
-            list_box = urwid.ListBox(list_walker)
-            line_box = urwid.LineBox(list_box, title="Select a Model")
-            self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
+            self.list_walker.set_focus(len(buttons) - 1 if not models else 0)
 
     def _model_chosen(self, button, model_name):
         self.on_select(model_name)
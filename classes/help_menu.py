@@ -8,7 +8,13 @@ class HelpMenu:
             "While in Chat:\n"
             "  ctrl+w : Toggle focus between Chat History and Input Box\n"
             "  ctrl+o : Quit the application\n"
-            "  esc : Back to main menu\n\n"
+            "  ctrl+k : Stop the reply being generated\n"
+            "  ctrl+n / ctrl+p : Next / previous open chat\n"
+            "  ctrl+x : Close this chat (it stays in History)\n"
+            "  ctrl+t : Compare models (send each message to several models)\n"
+            "  meta+s : Reply stats of this chat (latency, speed, tokens per model)\n"
+            "  esc : Back to main menu (open chats keep running)\n"
+            "  any key while a reply is typed out : Show the whole reply\n\n"
             "Inside the Input Box:\n"
             "  enter   : Send message\n"
             "  ctrl+l  : Insert a newline\n\n"
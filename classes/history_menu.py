@@ -1,21 +1,20 @@
 import urwid
-import os
-from config import Config
-import json
 from datetime import datetime
 
+# Chats fetched from the history index per query
+PAGE_SIZE = 50
+
 class HistoryMenu:
     def __init__(self, on_select_chat, on_back):
         self.on_select_chat = on_select_chat
         self.on_back = on_back
-        self.files = []
         self.view = None
 
 
     class StyledButton(urwid.Button):
         def __init__(self, file_name, chat_name, chat_model_name, ctime_str, mtime_str, on_press, user_data=None):
             super().__init__("")
-            
+
             # Styled portions of the button's text
             styled_text = [
                 ('menu_voice', f"> {file_name} "),                # File name with menu_voice style
@@ -28,76 +27,92 @@ class HistoryMenu:
 
             # Use SelectableIcon to preserve the cursor behavior
             self._w = urwid.AttrMap(urwid.SelectableIcon(styled_text, 0), None, focus_map='normal_content')
-            
+
             # Connect the button press signal
             urwid.connect_signal(self, 'click', on_press, user_data)
 
 
-    def populate(self, files):
-        self.files = files
-
-        # If no files, show a message
-        if not files:
+    class HistoryWalker(urwid.ListWalker):
+        """
+        Pages chats out of the history index as the list is scrolled and only
+        builds buttons for the positions that are displayed. The last position
+        is the Back button.
+        """
+        def __init__(self, index, make_button, back_button):
+            self.index = index
+            self.make_button = make_button
+            self.back_button = back_button
+            self.total = index.count()
+            self.focus = 0
+            self._pages = {}
+            self._buttons = {}
+
+        def _entry(self, position):
+            page_no = position // PAGE_SIZE
+            page = self._pages.get(page_no)
+            if page is None:
+                page = self.index.page(page_no * PAGE_SIZE, PAGE_SIZE)
+                self._pages[page_no] = page
+            offset = position % PAGE_SIZE
+            return page[offset] if offset < len(page) else None
+
+        def _widget(self, position):
+            if position == self.total:
+                return self.back_button
+            button = self._buttons.get(position)
+            if button is None:
+                entry = self._entry(position)
+                if entry is None:
+                    return None
+                button = self.make_button(entry)
+                self._buttons[position] = button
+            return button
+
+        def get_focus(self):
+            return self._widget(self.focus), self.focus
+
+        def set_focus(self, position):
+            self.focus = position
+            self._modified()
+
+        def get_next(self, position):
+            if position >= self.total:
+                return None, None
+            widget = self._widget(position + 1)
+            return (widget, position + 1) if widget is not None else (None, None)
+
+        def get_prev(self, position):
+            if position <= 0:
+                return None, None
+            return self._widget(position - 1), position - 1
+
+
+    def populate(self, index):
+        # If no chats, show a message
+        if index.count() == 0:
             text = urwid.Text("No saved chats found.\nPress 'esc' to go back.")
             line_box = urwid.LineBox(urwid.Filler(text), title="History")
             self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
             return
 
-        # HISTORY_DETAILS_DIR and HISTORY_DIR should match what we have in chat_logic.py
-        # Assuming they are defined in chat_logic.py. If not, define them here similarly.
-        from chat_logic import HISTORY_DETAILS_DIR, HISTORY_DIR
-
-        entries = []
-        for f in files:
-            # Full paths
-            history_path = os.path.join(HISTORY_DIR, f)
-            details_path = os.path.join(HISTORY_DETAILS_DIR, f)
-
-            # Load details if available
-            chat_name = "NO NAME"
-            chat_model_name = ""
-            ctime_str = ""
-            if os.path.exists(details_path):
-                with open(details_path, "r") as df:
-                    details_data = json.load(df)
-                    chat_name = details_data.get("name", "NO NAME")
-                    ctime_str = details_data.get("create_date", "")
-                    chat_model_name = details_data.get("model_name", "")
-
-            if chat_name=="":chat_name = "NO NAME"
-
-            # Get timestamps
-            # ctime: creation (or metadata change) time, mtime: last modification time
-            #ctime = os.path.getctime(history_path)
-            mtime = os.path.getmtime(history_path)
-
-            # Convert to human-readable format
-            #ctime_str = datetime.fromtimestamp(ctime).strftime("%Y-%m-%d %H:%M:%S")
-            mtime_str = datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
-
-            # Store a tuple with all info and use it for sorting
-            # We'll sort by mtime descending later
-            entries.append((f, chat_name, chat_model_name, ctime_str, mtime_str, mtime))
-
-        # Sort entries by modified time descending
-        entries.sort(key=lambda x: x[4], reverse=True)
-
-        buttons = []
-        for f, chat_name, chat_model_name, ctime_str, mtime_str, _ in entries:
-            # Create the custom StyledButton
-            btn = self.StyledButton(f, chat_name, chat_model_name, ctime_str, mtime_str, 
-                            on_press=self._on_chat_selected, user_data=f)
-            buttons.append(btn)
-
         # Add a Back button
         back_btn = urwid.Button(('normal_content',"Back"), on_press=lambda x: self.on_back())
-        buttons.append(back_btn)
 
-        list_walker = urwid.SimpleFocusListWalker(buttons)
+        # Chats are sorted by modified time descending by the index
+        list_walker = self.HistoryWalker(index, self._make_button, back_btn)
         list_box = urwid.ListBox(list_walker)
         line_box = urwid.LineBox(list_box, title="Select a Chat")
         self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
 
+    def _make_button(self, entry):
+        chat_name = entry["name"] or "NO NAME"
+        # Convert to human-readable format
+        mtime_str = datetime.fromtimestamp(entry["mtime"]).strftime("%Y-%m-%d %H:%M:%S")
+        if entry.get("archived"):
+            mtime_str += " (archived)"
+        return self.StyledButton(entry["filename"], chat_name, entry["model_name"], entry["create_date"], mtime_str,
+                        on_press=self._on_chat_selected, user_data=entry["filename"])
+
     def _on_chat_selected(self, button, filename):
         self.on_select_chat(filename)
 
@@ -106,4 +121,4 @@ class HistoryMenu:
 
     def handle_input(self, key):
         if key == 'esc':
-            self.on_back()
\ No newline at end of file
+            self.on_back()
@@ -1,37 +1,80 @@
 import urwid
+from datetime import datetime, timezone
+
+def resident_label(expires_at):
+    """Marker for a model loaded in the server's memory, with the time it has left."""
+    if expires_at is None:
+        return " [loaded]"
+    left = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    if left > 24 * 3600:
+        return " [loaded]"  # keep_alive -1: stays loaded
+    return f" [loaded, {max(0, int(left // 60))} min left]"
 
 class ModelMenu:
-    def __init__(self, models, on_select_model, on_back, config_model):
+    def __init__(self, models, on_select_model, on_back, config_model, loading=False, running=None):
         self.on_select_model = on_select_model
         self.on_back = on_back
+        self.config_model = config_model
+        self.models = models
+        self.running = running or {}  # Models loaded in the server's memory: {name: expires_at}
+
+        # Create a ListBox to display the model buttons; its contents are
+        # replaced in place when a fresh model list arrives
+        self.list_walker = urwid.SimpleFocusListWalker([])
+        list_box = urwid.ListBox(self.list_walker)
+        line_box = urwid.LineBox(list_box, title="Select a Model")
+        self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
+        self.set_models(models, loading)
+
+    def set_models(self, models, loading=False):
+        """Rebuild the model buttons, keeping the focus on the same model if it is still listed."""
+        self.models = models
+        focused_model = None
+        if self.list_walker:
+            focused_model = getattr(self.list_walker.get_focus()[0], "model_name", None)
 
+        buttons = []
         if not models:
-            text = urwid.Text("No models found.\nPress 'esc' to go back.")
-            self.view = urwid.LineBox(urwid.Filler(text), title="Models")
+            if loading:
+                buttons.append(urwid.Text("Loading models..."))
+            else:
+                buttons.append(urwid.Text("No models found.\nPress 'esc' to go back."))
         else:
-            # Create a button for each model name
-            buttons = []
-
             # Add a "Use Default Model" option
-            default_btn = urwid.Button(('menu_voice',f"Use Default Model ({config_model})"))
-            urwid.connect_signal(default_btn, 'click', self._on_model_selected, config_model)
+            default_label = f"Use Default Model ({self.config_model})"
+            if self.config_model in self.running:
+                default_label += resident_label(self.running[self.config_model])
+            default_btn = urwid.Button(('menu_voice', default_label))
+            urwid.connect_signal(default_btn, 'click', self._on_model_selected, self.config_model)
             buttons.append(default_btn)
 
+            # Create a button for each model name
             for m in models:
-                btn = urwid.Button(('menu_voice',m))
+                label = m + resident_label(self.running[m]) if m in self.running else m
+                btn = urwid.Button(('menu_voice', label))
+                btn.model_name = m
                 urwid.connect_signal(btn, 'click', self._on_model_selected, m)
                 buttons.append(btn)
-            
-            # Add a Back button
-            back_btn = urwid.Button(('normal_content','Back'))
-            urwid.connect_signal(back_btn, 'click', lambda button: self.on_back())
-            buttons.append(back_btn)
-
-            # Create a ListBox to display these buttons
-            list_walker = urwid.SimpleFocusListWalker(buttons)
-            list_box = urwid.ListBox(list_walker)
-            line_box = urwid.LineBox(list_box, title="Select a Model")
-            self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
+
+        # Add a Back button
+        back_btn = urwid.Button(('normal_content','Back'))
+        urwid.connect_signal(back_btn, 'click', lambda button: self.on_back())
+        buttons.append(back_btn)
+
+        self.list_walker[:] = buttons
+        for position, btn in enumerate(buttons):
+            if focused_model is not None and getattr(btn, "model_name", None) == focused_model:
+                self.list_walker.set_focus(position)
+                break
+        else:
+            # Start on the first selectable entry
+            self.list_walker.set_focus(1 if not models else 0)
+
+    def set_running(self, running):
+        """Mark the models that are loaded (see ModelCatalog.refresh_running)."""
+        self.running = running
+        if self.models:
+            self.set_models(self.models)
 
     def _on_model_selected(self, button, model_name):
         self.on_select_model(model_name)
@@ -42,4 +85,4 @@ class ModelMenu:
     def handle_input(self, key):
         # Allow pressing 'esc' to go back as well
         if key == 'esc':
-            self.on_back()
\ No newline at end of file
+            self.on_back()
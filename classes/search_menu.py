@@ -0,0 +1,75 @@
+import urwid
+import time
+from ui_elements import CustomEdit
+
+class SearchMenu:
+    class ResultButton(urwid.Button):
+        def __init__(self, result, on_press):
+            super().__init__("")
+
+            who = "You" if result["role"] == "user" else "AIm"
+            styled_text = [
+                ('menu_voice', f"> {result['name'] or 'NO NAME'} "),
+                ('chat_model_style', f"({result['model_name']})"),
+                "\n",
+                ('who', f" {who}"), f": {result['snippet']}\n"
+            ]
+
+            # Use SelectableIcon to preserve the cursor behavior
+            self._w = urwid.AttrMap(urwid.SelectableIcon(styled_text, 0), None, focus_map='normal_content')
+            urwid.connect_signal(self, 'click', on_press, (result["filename"], result["position"]))
+
+    def __init__(self, search, on_select_result, on_back):
+        """
+        :param search: Callable returning the ranked results for a query.
+        :param on_select_result: Callback(filename, message_position) to open a chat at a message.
+        :param on_back: Callback to return to the main menu.
+        """
+        self.search = search
+        self.on_select_result = on_select_result
+        self.on_back = on_back
+
+        self.query_edit = CustomEdit([("menu_voice", "Search"), ": "])
+        self.query_edit.set_message_handler(self._run_search)
+        self.status = urwid.Text("Type one or more words and press enter.")
+
+        self.results = urwid.SimpleFocusListWalker([])
+        self.layout = urwid.Pile([
+            ('pack', self.query_edit),
+            ('pack', self.status),
+            ('pack', urwid.AttrMap(urwid.Divider("-"), "divider")),
+            urwid.ListBox(self.results)
+        ])
+        line_box = urwid.LineBox(self.layout, title="Search Chats")
+        self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
+
+    def _run_search(self):
+        query = self.query_edit.get_edit_text().strip()
+        if not query:
+            return
+        started = time.time()
+        results = self.search(query)
+        elapsed_ms = (time.time() - started) * 1000
+
+        self.results[:] = [self.ResultButton(r, self._on_result_selected) for r in results]
+        self.status.set_text(f"{len(results)} results in {elapsed_ms:.0f} ms. Press enter on a result to open the chat.")
+        if results:
+            # Move to the best match so arrow keys browse the results straight away
+            self.results.set_focus(0)
+            self.layout.focus_position = 3
+
+    def indexing_done(self, count):
+        """Called once chats saved before search existed have been indexed."""
+        if count:
+            self.status.set_text(f"Indexed {count} older chats for search.")
+
+    def _on_result_selected(self, button, target):
+        filename, position = target
+        self.on_select_result(filename, position)
+
+    def widget(self):
+        return self.view
+
+    def handle_input(self, key):
+        if key == 'esc':
+            self.on_back()
@@ -0,0 +1,29 @@
+import urwid
+from telemetry import format_aggregate
+
+class StatsMenu:
+    def __init__(self, title, per_model, on_back):
+        """
+        :param title: LineBox title ("Chat Stats", "Model Stats").
+        :param per_model: {model: telemetry.aggregate() result}.
+        :param on_back: Callback to return to the previous screen.
+        """
+        self.on_back = on_back
+        lines = []
+        for model, totals in per_model.items():
+            lines.extend(format_aggregate(model or "(unknown model)", totals))
+            lines.append("")
+        if not per_model:
+            lines.append("No replies with stats yet.\n")
+        lines.append("Press 'esc' to go back.")
+
+        list_box = urwid.ListBox(urwid.SimpleFocusListWalker([urwid.Text(line) for line in lines]))
+        line_box = urwid.LineBox(list_box, title=title)
+        self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
+
+    def widget(self):
+        return self.view
+
+    def handle_input(self, key):
+        if key == 'esc':
+            self.on_back()
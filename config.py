@@ -7,23 +7,51 @@ DEFAULT_CONFIG = {
     "ollama_host": "http://127.0.0.1:11434",  # Default host for Ollama
     "model_name": "",          # Default model name
     "typewriter_speed": 1,      # Default typewriter speed
-    "theme": 0      # Default theme
+    "theme": 0,      # Default theme
+    "stream_replies": True,      # Show AI replies token by token as they are generated
+    "history_fsync": "interval",     # "always", "interval" or "never"
+    "history_fsync_interval": 5,     # Seconds between fsyncs with the "interval" policy
+    "context_strategy": "full",      # "full", "prefix_stable", "sliding_window" or "summary"
+    "num_ctx": 0,                    # Model context size in tokens (0 = server default)
+    "context_reply_reserve": 512,    # Tokens kept free for the reply when trimming
+    "system_prompt": "",             # Optional system prompt, always sent first
+    "generate_context": False,       # Continue replies from the server's token context instead of resending the chat
+    "response_cache": False,         # Answer repeated requests from an on-disk cache of replies
+    "response_cache_max_mb": 50,     # Cache size limit; least recently used replies are dropped first
+    "response_cache_max_age": 604800, # Seconds a cached reply stays valid (0 = no limit)
+    "request_timeout": 300,          # Seconds to wait for data from the server
+    "connect_timeout": 5,            # Seconds to wait for a connection
+    "request_retries": 2,            # Retries for requests that fail before any data arrives
+    "retry_backoff": 0.5,            # First retry delay in seconds, doubled on each retry
+    "connection_pool_size": 4,       # Keep-alive connections kept open to the server
+    "model_list_ttl": 60,            # Seconds the cached model list is considered fresh
+    "max_concurrent_generations": 2, # Replies generated at the same time
+    "generation_timeout": 600,       # Seconds a reply may take before it is stopped (0 = no limit)
+    "warm_up_models": True,          # Load the model in the background as soon as a chat opens
+    "keep_alive": "",                # How long models stay loaded after a request ("10m", 3600, -1 = forever, "" = server default)
+    "model_keep_alive": {},          # Per model keep_alive overrides, e.g. {"llama3:70b": "30m"}
+    "archive_after_days": 0,         # Pack chats untouched for this many days into compressed archives (0 = off)
+    "archive_compression": "gzip",   # "gzip" or "zstd" (needs the zstandard package)
+    "debug_log": False,              # Write debug.log (also enabled by SHELLMIND_DEBUG=1)
+    "debug_log_level": "DEBUG",      # DEBUG, INFO, WARNING or ERROR
+    "debug_log_max_bytes": 1000000   # debug.log is rotated at this size
 }
 
 class Config:
-    def __init__(self):
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
         self._ensure_config_file()
         self._data = self._load_config()
 
     def _ensure_config_file(self):
         # Check if the config file exists
-        if not os.path.exists(CONFIG_FILE):
-            with open(CONFIG_FILE, "w") as f:
+        if not os.path.exists(self.path):
+            with open(self.path, "w") as f:
                 # Create the file with default values
                 json.dump(DEFAULT_CONFIG, f, indent=4)
 
     def _load_config(self):
-        with open(CONFIG_FILE, "r") as f:
+        with open(self.path, "r") as f:
             return json.load(f)
 
     @property
@@ -41,11 +69,124 @@ class Config:
     @property
     def theme(self):
         return self._data.get("theme")
+
+    @property
+    def stream_replies(self):
+        return self._data.get("stream_replies", True)
+
+    @property
+    def history_fsync(self):
+        return self._data.get("history_fsync", "interval")
+
+    @property
+    def history_fsync_interval(self):
+        return self._data.get("history_fsync_interval", 5)
+
+    @property
+    def context_strategy(self):
+        return self._data.get("context_strategy", "full")
+
+    @property
+    def num_ctx(self):
+        return self._data.get("num_ctx", 0)
+
+    @property
+    def context_reply_reserve(self):
+        return self._data.get("context_reply_reserve", 512)
+
+    @property
+    def system_prompt(self):
+        return self._data.get("system_prompt", "")
+
+    @property
+    def generate_context(self):
+        return self._data.get("generate_context", False)
+
+    @property
+    def response_cache(self):
+        return self._data.get("response_cache", False)
+
+    @property
+    def response_cache_max_mb(self):
+        return self._data.get("response_cache_max_mb", 50)
+
+    @property
+    def response_cache_max_age(self):
+        return self._data.get("response_cache_max_age", 604800)
+
+    @property
+    def request_timeout(self):
+        return self._data.get("request_timeout", 300)
+
+    @property
+    def connect_timeout(self):
+        return self._data.get("connect_timeout", 5)
+
+    @property
+    def request_retries(self):
+        return self._data.get("request_retries", 2)
+
+    @property
+    def retry_backoff(self):
+        return self._data.get("retry_backoff", 0.5)
+
+    @property
+    def connection_pool_size(self):
+        return self._data.get("connection_pool_size", 4)
+
+    @property
+    def model_list_ttl(self):
+        return self._data.get("model_list_ttl", 60)
+
+    @property
+    def max_concurrent_generations(self):
+        return self._data.get("max_concurrent_generations", 2)
+
+    @property
+    def generation_timeout(self):
+        return self._data.get("generation_timeout", 600)
+
+    @property
+    def warm_up_models(self):
+        return self._data.get("warm_up_models", True)
+
+    @property
+    def keep_alive(self):
+        return self._data.get("keep_alive", "")
+
+    @property
+    def model_keep_alive(self):
+        return self._data.get("model_keep_alive", {})
+
+    def keep_alive_for(self, model):
+        """keep_alive sent with requests for model, or None for the server default."""
+        value = self.model_keep_alive.get(model, self.keep_alive)
+        return None if value in ("", None) else value
+
+    @property
+    def archive_after_days(self):
+        return self._data.get("archive_after_days", 0)
+
+    @property
+    def archive_compression(self):
+        return self._data.get("archive_compression", "gzip")
+
+    @property
+    def debug_log(self):
+        return self._data.get("debug_log", False)
+
+    @property
+    def debug_log_level(self):
+        return self._data.get("debug_log_level", "DEBUG")
+
+    @property
+    def debug_log_max_bytes(self):
+        return self._data.get("debug_log_max_bytes", 1000000)
     
     def set_config(self, key, value):
         self._data[key] = value
         self._save_config()
 
     def _save_config(self):
-        with open(CONFIG_FILE, "w") as f:
+        with open(self.path, "w") as f:
             json.dump(self._data, f, indent=4)
\ No newline at end of file
@@ -0,0 +1,200 @@
+import math
+from debug import debug, warning
+
+# Rough local token estimate: ~4 characters per token plus a few tokens of
+# chat-template overhead per message. Cheap enough to run on every turn.
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Budget used by trimming strategies when num_ctx is not configured
+DEFAULT_NUM_CTX = 2048
+
+# When the window has to move, trim down to this fraction of the budget so
+# the start of the window (and the server's KV cache prefix) stays put for
+# several turns instead of shifting by one message every turn.
+LOW_WATERMARK = 0.75
+
+SUMMARY_PROMPT = (
+    "Summarize the conversation below in a few short paragraphs. Keep names, facts, "
+    "decisions and open questions; drop greetings and filler."
+)
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text or "") / CHARS_PER_TOKEN)
+
+
+def estimate_message_tokens(message):
+    return estimate_tokens(message.get("content", "")) + MESSAGE_OVERHEAD_TOKENS
+
+
+def _wire_message(message):
+    # Only role and content go to the server; anything else we keep on a message is local
+    return {"role": message["role"], "content": message.get("content", "")}
+
+
+class FullHistory:
+    """Send the whole conversation every turn (the original behaviour)."""
+
+    name = "full"
+
+    def __init__(self, num_ctx=0, reply_reserve=0, system_prompt="", summarize=None):
+        self.system_prompt = system_prompt
+
+    async def build(self, messages):
+        context = [_wire_message(m) for m in messages]
+        if self.system_prompt:
+            context.insert(0, {"role": "system", "content": self.system_prompt})
+        return context
+
+    def reset(self):
+        pass
+
+
+class PrefixStable:
+    """
+    Send the whole conversation, append-only, so every request starts with exactly
+    the bytes of the previous one and the server can reuse its KV cache for them.
+    The system prompt is fixed when the chat opens. If an earlier message did
+    change, the request is still sent but the broken prefix is logged.
+    """
+
+    name = "prefix_stable"
+
+    def __init__(self, num_ctx=0, reply_reserve=0, system_prompt="", summarize=None):
+        self.system_prompt = system_prompt
+        self.sent = []  # Messages of the previous request
+
+    async def build(self, messages):
+        context = [_wire_message(m) for m in messages]
+        if self.system_prompt:
+            context.insert(0, {"role": "system", "content": self.system_prompt})
+        for position, (message, previous) in enumerate(zip(context, self.sent)):
+            if message != previous:
+                warning("Conversation prefix changed at message %d; the server re-evaluates from there", position)
+                break
+        self.sent = context
+        return context
+
+    def reset(self):
+        self.sent = []
+
+
+class SlidingWindow:
+    """
+    Keep the most recent messages that fit in num_ctx minus a reserve for the reply.
+    The system prompt is pinned and always sent first.
+    """
+
+    name = "sliding_window"
+
+    def __init__(self, num_ctx=0, reply_reserve=0, system_prompt="", summarize=None):
+        self.num_ctx = num_ctx or DEFAULT_NUM_CTX
+        self.reply_reserve = min(reply_reserve, self.num_ctx // 2)
+        self.system_prompt = system_prompt
+        self.window_start = 0  # Index of the oldest message still sent
+
+    @property
+    def budget(self):
+        return self.num_ctx - self.reply_reserve
+
+    def reset(self):
+        self.window_start = 0
+
+    def _pinned(self):
+        if self.system_prompt:
+            return [{"role": "system", "content": self.system_prompt}]
+        return []
+
+    def _advance_window(self, messages, fixed_tokens):
+        """Move window_start forward until the window fits the budget; returns the dropped messages."""
+        if self.window_start > len(messages):
+            self.window_start = 0  # History was replaced (e.g. a different chat was loaded)
+
+        window_tokens = sum(estimate_message_tokens(m) for m in messages[self.window_start:])
+        if fixed_tokens + window_tokens <= self.budget:
+            return []
+
+        target = self.budget * LOW_WATERMARK
+        old_start = self.window_start
+        # Always keep at least the newest message, even if it alone is over budget
+        while self.window_start < len(messages) - 1 and fixed_tokens + window_tokens > target:
+            window_tokens -= estimate_message_tokens(messages[self.window_start])
+            self.window_start += 1
+        debug("Context window moved from message %d to %d (~%d tokens, budget %d)",
+              old_start, self.window_start, fixed_tokens + window_tokens, self.budget)
+        return messages[old_start:self.window_start]
+
+    async def build(self, messages):
+        pinned = self._pinned()
+        fixed_tokens = sum(estimate_message_tokens(m) for m in pinned)
+        self._advance_window(messages, fixed_tokens)
+        return pinned + [_wire_message(m) for m in messages[self.window_start:]]
+
+
+class RollingSummary(SlidingWindow):
+    """
+    Sliding window where the messages that fall out of the window are folded into
+    a running summary written by the model, sent right after the system prompt.
+    """
+
+    name = "summary"
+
+    def __init__(self, num_ctx=0, reply_reserve=0, system_prompt="", summarize=None):
+        super().__init__(num_ctx, reply_reserve, system_prompt)
+        self.summarize = summarize
+        self.summary = ""
+
+    def reset(self):
+        super().reset()
+        self.summary = ""
+
+    def _summary_message(self):
+        return {"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"}
+
+    async def build(self, messages):
+        pinned = self._pinned()
+        fixed_tokens = sum(estimate_message_tokens(m) for m in pinned)
+        # Leave room for the summary itself: it is capped to a quarter of the budget
+        summary_allowance = self.budget // 4
+        dropped = self._advance_window(messages, fixed_tokens + summary_allowance)
+
+        if dropped and self.summarize is not None:
+            transcript = "\n\n".join(f"{m['role']}: {m.get('content', '')}" for m in dropped)
+            if self.summary:
+                transcript = f"Previous summary:\n{self.summary}\n\n{transcript}"
+            try:
+                summary = await self.summarize(transcript)
+                # Never let the summary eat into the window budget
+                self.summary = summary[:summary_allowance * CHARS_PER_TOKEN]
+            except Exception as e:
+                # Without a fresh summary we still send the trimmed window
+                warning("Summary generation failed: %s", e)
+
+        if self.summary:
+            pinned.append(self._summary_message())
+        return pinned + [_wire_message(m) for m in messages[self.window_start:]]
+
+
+CONTEXT_STRATEGIES = {
+    FullHistory.name: FullHistory,
+    PrefixStable.name: PrefixStable,
+    SlidingWindow.name: SlidingWindow,
+    RollingSummary.name: RollingSummary
+}
+
+
+def create_context_strategy(config, summarize=None):
+    """Build the strategy selected by config.context_strategy (defaults to the full history)."""
+    if config is None:
+        return FullHistory()
+    strategy_class = CONTEXT_STRATEGIES.get(config.context_strategy)
+    if strategy_class is None:
+        warning("Unknown context strategy '%s'. Using full history.", config.context_strategy)
+        strategy_class = FullHistory
+    return strategy_class(
+        num_ctx=config.num_ctx,
+        reply_reserve=config.context_reply_reserve,
+        system_prompt=config.system_prompt,
+        summarize=summarize
+    )
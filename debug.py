@@ -1,11 +1,95 @@
+import logging
+import logging.handlers
 import os
+import queue
+import time
 
 DEBUG_FILE = os.path.join(os.path.dirname(__file__), "debug.log")
 
+# Logging is off until setup_logging() enables it; a disabled call costs one level check.
+# Pass arguments separately (debug("Took %.2fs", t)) so nothing is formatted when off.
+logger = logging.getLogger("shellmind")
+logger.setLevel(logging.CRITICAL + 1)
+logger.propagate = False
+
+_listener = None
+
+
 def clear_debug_log():
     with open(DEBUG_FILE, "w") as f:
         f.write("Debug Log Initialized\n")
 
-def debug(message):
-    with open(DEBUG_FILE, "a") as f:
-        f.write(message + "\n")
+
+def setup_logging(enabled=False, level="DEBUG", max_bytes=1_000_000, backup_count=3):
+    """
+    Enable logging to debug.log. Records are queued by the caller and written
+    by a background thread, and the file is rotated once it reaches max_bytes.
+    The SHELLMIND_DEBUG environment variable turns logging on regardless of config.
+    """
+    global _listener
+    if os.environ.get("SHELLMIND_DEBUG"):
+        enabled = True
+    if not enabled or _listener is not None:
+        return
+
+    clear_debug_log()
+    file_handler = logging.handlers.RotatingFileHandler(
+        DEBUG_FILE, maxBytes=max_bytes, backupCount=backup_count
+    )
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(getattr(logging, str(level).upper(), logging.DEBUG))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+
+
+def shutdown_logging():
+    """Write out everything still queued (call before exiting)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class PhaseTimer:
+    """
+    Times consecutive phases of something slow (application startup) and logs
+    them as one line: mark(name) closes the phase that ran since the last mark.
+    """
+
+    def __init__(self, name, started=None):
+        self.name = name
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = []
+        self._last = self.started
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def total(self):
+        return self._last - self.started
+
+    def log(self):
+        info("%s: %s (total %.0fms)", self.name,
+             ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases), self.total() * 1000)
+
+
+def debug(message, *args):
+    logger.debug(message, *args)
+
+
+def info(message, *args):
+    logger.info(message, *args)
+
+
+def warning(message, *args):
+    logger.warning(message, *args)
+
+
+def error(message, *args):
+    logger.error(message, *args)
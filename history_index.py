@@ -0,0 +1,347 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from debug import debug, warning
+from telemetry import SERVER_FIELDS, COLD_LOAD_SECONDS
+
+# Per-reply stats kept in the turn_stats table (see telemetry.reply_stats)
+TURN_STAT_FIELDS = ("total_time", "time_to_first_token", "tokens_per_sec", "prompt_tokens_per_sec") + SERVER_FIELDS
+
+
+class HistoryIndex:
+    """
+    SQLite catalogue of saved chats (name, model, dates, message count), so the
+    History menu can page through thousands of chats without opening their files.
+    It also holds a full-text index of every message for the Search screen, the
+    timing stats of every reply for the per-model statistics, and where each
+    archived chat is stored in the compressed archive (see archive.ArchiveStore).
+
+    ChatManager keeps it up to date as conversations are saved, renamed and
+    deleted; reconcile() picks up files written by older versions or copied in by hand.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # A new (or deleted and rebuilt) index: the archived chats must be listed again
+        self.created = not os.path.exists(path)
+        self._lock = threading.Lock()
+        # Saves happen on worker threads too; access is serialized by the lock
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS chats (
+                filename TEXT PRIMARY KEY,
+                name TEXT NOT NULL DEFAULT '',
+                model_name TEXT NOT NULL DEFAULT '',
+                create_date TEXT NOT NULL DEFAULT '',
+                mtime REAL NOT NULL DEFAULT 0,
+                message_count INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS chats_by_mtime ON chats (mtime DESC);
+        """)
+        self._db.commit()
+        self._migrate()
+        self.fts = self._db.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'"
+        ).fetchone() is not None
+
+    def _migrate(self):
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # Full-text search over every message. The FTS5 table indexes the
+            # messages table (external content) and triggers keep the two in sync.
+            self._db.executescript("""
+                ALTER TABLE chats ADD COLUMN search_indexed INTEGER NOT NULL DEFAULT 0;
+                CREATE TABLE messages (
+                    id INTEGER PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    role TEXT NOT NULL DEFAULT '',
+                    content TEXT NOT NULL DEFAULT '',
+                    UNIQUE (filename, position)
+                );
+            """)
+            try:
+                self._db.executescript("""
+                    CREATE VIRTUAL TABLE messages_fts USING fts5(
+                        content, content='messages', content_rowid='id'
+                    );
+                    CREATE TRIGGER messages_ai AFTER INSERT ON messages BEGIN
+                        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+                    END;
+                    CREATE TRIGGER messages_ad AFTER DELETE ON messages BEGIN
+                        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    END;
+                    CREATE TRIGGER messages_au AFTER UPDATE OF content ON messages BEGIN
+                        INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                        INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+                    END;
+                """)
+            except sqlite3.OperationalError as e:
+                # SQLite built without FTS5: search falls back to a plain scan
+                warning("FTS5 not available, search will be slower: %s", e)
+            self._db.execute("PRAGMA user_version = 1")
+            self._db.commit()
+        if version < 2:
+            # Timing of every reply, for the per-model statistics
+            self._db.executescript("""
+                CREATE TABLE turn_stats (
+                    filename TEXT NOT NULL,
+                    position INTEGER NOT NULL,
+                    model TEXT NOT NULL DEFAULT '',
+                    created REAL NOT NULL DEFAULT 0,
+                    total_time REAL,
+                    time_to_first_token REAL,
+                    tokens_per_sec REAL,
+                    prompt_tokens_per_sec REAL,
+                    total_duration INTEGER,
+                    load_duration INTEGER,
+                    prompt_eval_count INTEGER,
+                    prompt_eval_duration INTEGER,
+                    eval_count INTEGER,
+                    eval_duration INTEGER,
+                    PRIMARY KEY (filename, position)
+                );
+                CREATE INDEX turn_stats_by_model ON turn_stats (model);
+                PRAGMA user_version = 2;
+            """)
+            self._db.commit()
+        if version < 3:
+            # Location of archived chats: their files are gone, the chats row stays
+            self._db.executescript("""
+                CREATE TABLE archive (
+                    filename TEXT PRIMARY KEY,
+                    segment TEXT NOT NULL,
+                    offset INTEGER NOT NULL,
+                    length INTEGER NOT NULL
+                );
+                PRAGMA user_version = 3;
+            """)
+            self._db.commit()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            self._db.execute(sql, params)
+            self._db.commit()
+
+    def update_details(self, filename, name, model_name, create_date):
+        self._execute("""
+            INSERT INTO chats (filename, name, model_name, create_date, mtime)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (filename) DO UPDATE SET
+                name = excluded.name,
+                model_name = excluded.model_name,
+                create_date = excluded.create_date
+        """, (filename, name, model_name, create_date, time.time()))
+
+    def touch(self, filename, message_count, mtime=None):
+        """Record that a chat was written to."""
+        self._execute("""
+            INSERT INTO chats (filename, mtime, message_count) VALUES (?, ?, ?)
+            ON CONFLICT (filename) DO UPDATE SET
+                mtime = excluded.mtime,
+                message_count = excluded.message_count
+        """, (filename, mtime if mtime is not None else time.time(), message_count))
+
+    def rename(self, old_filename, new_filename):
+        with self._lock:
+            self._db.execute("UPDATE OR REPLACE chats SET filename = ? WHERE filename = ?", (new_filename, old_filename))
+            self._db.execute("UPDATE OR REPLACE messages SET filename = ? WHERE filename = ?", (new_filename, old_filename))
+            self._db.execute("UPDATE OR REPLACE turn_stats SET filename = ? WHERE filename = ?", (new_filename, old_filename))
+            self._db.execute("UPDATE OR REPLACE archive SET filename = ? WHERE filename = ?", (new_filename, old_filename))
+            self._db.commit()
+
+    def remove(self, filename):
+        with self._lock:
+            self._db.execute("DELETE FROM chats WHERE filename = ?", (filename,))
+            self._db.execute("DELETE FROM messages WHERE filename = ?", (filename,))
+            self._db.execute("DELETE FROM turn_stats WHERE filename = ?", (filename,))
+            self._db.execute("DELETE FROM archive WHERE filename = ?", (filename,))
+            self._db.commit()
+
+    def archive_candidates(self, before, limit):
+        """Chats last written before this time that are not archived yet, oldest first."""
+        with self._lock:
+            return [row[0] for row in self._db.execute("""
+                SELECT filename FROM chats
+                WHERE mtime < ? AND filename NOT IN (SELECT filename FROM archive)
+                ORDER BY mtime LIMIT ?
+            """, (before, limit))]
+
+    def set_archived(self, locations):
+        """Record where chats were archived: [(filename, segment, offset, length)]."""
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?)", locations)
+            self._db.commit()
+
+    def add_archived(self, chats):
+        """
+        List archived chats found in the segment files:
+        [(filename, name, model_name, create_date, mtime, message_count, segment, offset, length)].
+        """
+        with self._lock:
+            self._db.executemany("""
+                INSERT OR REPLACE INTO chats (filename, name, model_name, create_date, mtime, message_count)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [chat[:6] for chat in chats])
+            self._db.executemany("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?)",
+                                 [(chat[0],) + tuple(chat[6:]) for chat in chats])
+            self._db.commit()
+
+    def archive_location(self, filename):
+        """(segment, offset, length) of an archived chat, or None."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT segment, offset, length FROM archive WHERE filename = ?", (filename,)
+            ).fetchone()
+
+    def unarchive(self, filename):
+        self._execute("DELETE FROM archive WHERE filename = ?", (filename,))
+
+    def index_messages(self, filename, messages, start=0):
+        """
+        Add messages[start:] of a chat to the search index (changed messages are re-indexed),
+        and the stats of the replies among them to turn_stats.
+        """
+        rows = [(filename, position, m.get("role", ""), m.get("content", ""))
+                for position, m in enumerate(messages[start:], start)]
+        stat_rows = [
+            (filename, position, m["stats"].get("model") or m.get("model") or "", m["stats"].get("created") or 0)
+            + tuple(m["stats"].get(field) for field in TURN_STAT_FIELDS)
+            for position, m in enumerate(messages[start:], start)
+            if m.get("stats") and not m["stats"].get("cached")
+        ]
+        with self._lock:
+            self._db.executemany("""
+                INSERT INTO messages (filename, position, role, content) VALUES (?, ?, ?, ?)
+                ON CONFLICT (filename, position) DO UPDATE SET
+                    role = excluded.role,
+                    content = excluded.content
+                WHERE content != excluded.content
+            """, rows)
+            if stat_rows:
+                placeholders = ", ".join("?" * (4 + len(TURN_STAT_FIELDS)))
+                self._db.executemany(f"""
+                    INSERT OR REPLACE INTO turn_stats (filename, position, model, created, {", ".join(TURN_STAT_FIELDS)})
+                    VALUES ({placeholders})
+                """, stat_rows)
+            self._db.execute("UPDATE chats SET search_indexed = 1 WHERE filename = ?", (filename,))
+            self._db.commit()
+
+    def is_search_indexed(self, filename):
+        with self._lock:
+            row = self._db.execute("SELECT search_indexed FROM chats WHERE filename = ?", (filename,)).fetchone()
+        return bool(row and row[0])
+
+    def unindexed_chats(self):
+        """Chats whose messages are not in the search index yet (e.g. saved by an older version)."""
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT filename FROM chats WHERE search_indexed = 0")]
+
+    def search(self, query, limit=50):
+        """Best matching messages for query, each with a highlighted snippet."""
+        terms = query.split()
+        if not terms:
+            return []
+        keys = ("filename", "position", "role", "snippet", "name", "model_name")
+        with self._lock:
+            if self.fts:
+                # Every term must match; the last one also matches as a prefix (search as you type)
+                quoted = ['"' + t.replace('"', '""') + '"' for t in terms]
+                quoted[-1] += "*"
+                rows = self._db.execute("""
+                    SELECT m.filename, m.position, m.role,
+                           snippet(messages_fts, 0, '[', ']', '...', 12),
+                           c.name, c.model_name
+                    FROM messages_fts
+                    JOIN messages m ON m.id = messages_fts.rowid
+                    JOIN chats c ON c.filename = m.filename
+                    WHERE messages_fts MATCH ?
+                    ORDER BY bm25(messages_fts)
+                    LIMIT ?
+                """, (" ".join(quoted), limit)).fetchall()
+            else:
+                conditions = " AND ".join("m.content LIKE ?" for _ in terms)
+                rows = self._db.execute(f"""
+                    SELECT m.filename, m.position, m.role, substr(m.content, 1, 80), c.name, c.model_name
+                    FROM messages m JOIN chats c ON c.filename = m.filename
+                    WHERE {conditions}
+                    ORDER BY c.mtime DESC
+                    LIMIT ?
+                """, [f"%{t}%" for t in terms] + [limit]).fetchall()
+        return [dict(zip(keys, row)) for row in rows]
+
+    def model_stats(self):
+        """Aggregated reply stats per model across all chats (same keys as telemetry.aggregate)."""
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT model, COUNT(*), AVG(total_time), AVG(time_to_first_token), AVG(tokens_per_sec),
+                       AVG(prompt_tokens_per_sec), COALESCE(SUM(prompt_eval_count), 0),
+                       COALESCE(SUM(eval_count), 0), SUM(COALESCE(load_duration, 0) >= ?)
+                FROM turn_stats GROUP BY model ORDER BY AVG(tokens_per_sec) DESC
+            """, (COLD_LOAD_SECONDS * 1e9,)).fetchall()
+        keys = ("turns", "avg_total_time", "avg_time_to_first_token", "avg_tokens_per_sec",
+                "avg_prompt_tokens_per_sec", "prompt_tokens", "generated_tokens", "cold_loads")
+        return {row[0]: dict(zip(keys, row[1:])) for row in rows}
+
+    def count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM chats").fetchone()[0]
+
+    def page(self, offset, limit):
+        """Chats ordered by last modification, newest first, as dicts."""
+        with self._lock:
+            rows = self._db.execute("""
+                SELECT c.filename, c.name, c.model_name, c.create_date, c.mtime, c.message_count,
+                       a.filename IS NOT NULL
+                FROM chats c LEFT JOIN archive a ON a.filename = c.filename
+                ORDER BY c.mtime DESC LIMIT ? OFFSET ?
+            """, (limit, offset)).fetchall()
+        keys = ("filename", "name", "model_name", "create_date", "mtime", "message_count", "archived")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def reconcile(self, filenames, history_dir, details_path_for):
+        """
+        Make the catalogue match the files on disk: index chats it doesn't know
+        (reading only their details files) and forget chats that are gone.
+        """
+        started = time.time()
+        on_disk = set(filenames)
+        with self._lock:
+            indexed = {row[0] for row in self._db.execute("SELECT filename FROM chats")}
+            archived = {row[0] for row in self._db.execute("SELECT filename FROM archive")}
+
+        missing = on_disk - indexed
+        # Archived chats have no file but are still listed
+        stale = indexed - on_disk - archived
+        rows = []
+        for filename in missing:
+            details = {}
+            details_path = details_path_for(filename)
+            if os.path.exists(details_path):
+                try:
+                    with open(details_path, "r") as f:
+                        details = json.load(f)
+                except (OSError, json.JSONDecodeError) as e:
+                    warning("Could not read %s: %s", details_path, e)
+            try:
+                mtime = os.path.getmtime(os.path.join(history_dir, filename))
+            except OSError:
+                continue
+            rows.append((filename, details.get("name", ""), details.get("model_name", ""),
+                         details.get("create_date", ""), mtime))
+
+        with self._lock:
+            self._db.executemany("""
+                INSERT OR REPLACE INTO chats (filename, name, model_name, create_date, mtime)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+            self._db.executemany("DELETE FROM chats WHERE filename = ?", [(f,) for f in stale])
+            self._db.executemany("DELETE FROM messages WHERE filename = ?", [(f,) for f in stale])
+            self._db.executemany("DELETE FROM turn_stats WHERE filename = ?", [(f,) for f in stale])
+            self._db.commit()
+        debug("History index reconciled in %.3fs: %d added, %d removed",
+              time.time() - started, len(rows), len(stale))
@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+import time
+from debug import debug, warning
+
+# fsync policies for conversation files:
+#   "always"   - fsync after every write (safest, slowest)
+#   "interval" - fsync at most once every fsync_interval seconds
+#   "never"    - leave flushing to the operating system
+FSYNC_POLICIES = ("always", "interval", "never")
+
+# Compact once the file holds this many records per message (and at least COMPACT_MIN_EXTRA extra records)
+COMPACT_RATIO = 2.0
+COMPACT_MIN_EXTRA = 64
+
+
+class HistoryStore:
+    """
+    Append-only storage for a single conversation in JSON Lines format.
+
+    Every line is one record:
+      {"i": 3, "m": {"role": "assistant", "content": "..."}}   - message 3 is (re)written
+      {"i": 3, "append": "more text"}                           - text appended to message 3
+    Reading replays the records in order, so the last record for an index wins.
+    Only new or changed messages are written on each sync, and the file is
+    rewritten (compacted) once superseded records pile up.
+    """
+
+    def __init__(self, path, fsync_policy="interval", fsync_interval=5.0):
+        self.path = path
+        self.fsync_policy = fsync_policy if fsync_policy in FSYNC_POLICIES else "interval"
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._persisted = 0          # Number of messages already on disk
+        self._last_message = None    # Copy of the last message on disk, to detect in-place updates
+        self._records = 0            # Number of lines in the file
+        self._last_fsync = time.time()
+
+    def load(self):
+        """
+        Read the conversation back, replaying all records. A torn last line left
+        by a crash is cut off the file, so the next sync starts on a fresh line.
+        """
+        messages = []
+        records = 0
+        size = 0
+        good_end = 0        # Byte offset just past the last readable record
+        needs_newline = False
+        with open(self.path, "rb") as f:
+            for raw in f:
+                size += len(raw)
+                line = raw.strip()
+                if not line:
+                    good_end = size
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn last line after a crash: everything before it is still valid
+                    warning("Skipping unreadable record in %s", self.path)
+                    continue
+                records += 1
+                good_end = size
+                needs_newline = not raw.endswith(b"\n")
+                index = record.get("i", len(messages))
+                if "m" in record:
+                    # Placed by index: a record after a lost one must not shift into its place
+                    if index >= len(messages):
+                        messages.extend([None] * (index + 1 - len(messages)))
+                    messages[index] = record["m"]
+                elif "append" in record and index < len(messages) and messages[index] is not None:
+                    messages[index]["content"] = messages[index].get("content", "") + record["append"]
+
+        if good_end < size or needs_newline:
+            warning("Repairing the end of %s", self.path)
+            with open(self.path, "r+b") as f:
+                f.truncate(good_end)
+                if needs_newline:
+                    f.seek(good_end)
+                    f.write(b"\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+        gaps = messages.count(None)
+        if gaps:
+            warning("%d messages missing from %s", gaps, self.path)
+            messages = [message for message in messages if message is not None]
+
+        with self._lock:
+            if gaps:
+                # Rewrite so the indexes on disk match the list again
+                self._compact(messages)
+            else:
+                self._persisted = len(messages)
+                self._last_message = dict(messages[-1]) if messages else None
+                self._records = records
+        return messages
+
+    def sync(self, messages):
+        """Write whatever changed in messages since the last sync."""
+        with self._lock:
+            if len(messages) < self._persisted:
+                # History was shortened: the log can't express that, rewrite it
+                self._compact(messages)
+                return
+
+            lines = []
+            if self._persisted and messages[self._persisted - 1] != self._last_message:
+                lines.append(self._update_record(self._persisted - 1, messages[self._persisted - 1]))
+            for index in range(self._persisted, len(messages)):
+                lines.append(json.dumps({"i": index, "m": messages[index]}))
+
+            if not lines:
+                return
+
+            records = self._records + len(lines)
+            if records - len(messages) >= COMPACT_MIN_EXTRA and records > len(messages) * COMPACT_RATIO:
+                self._compact(messages)
+                return
+
+            with open(self.path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+                self._maybe_fsync(f)
+            # Only counted once written, so after a failed write the next sync retries it
+            self._persisted = len(messages)
+            self._last_message = dict(messages[-1]) if messages else None
+            self._records = records
+
+    def compact(self, messages):
+        """Rewrite the file with exactly one record per message."""
+        with self._lock:
+            self._compact(messages)
+
+    def _update_record(self, index, message):
+        # A message that only grew (a reply still streaming) is stored as a delta
+        old = self._last_message
+        old_content = old.get("content", "")
+        new_content = message.get("content", "")
+        same_fields = {k: v for k, v in old.items() if k != "content"} == \
+            {k: v for k, v in message.items() if k != "content"}
+        if same_fields and new_content.startswith(old_content):
+            return json.dumps({"i": index, "append": new_content[len(old_content):]})
+        return json.dumps({"i": index, "m": message})
+
+    def _compact(self, messages):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            for index, message in enumerate(messages):
+                f.write(json.dumps({"i": index, "m": message}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._persisted = len(messages)
+        self._last_message = dict(messages[-1]) if messages else None
+        self._records = len(messages)
+        self._last_fsync = time.time()
+        debug("Compacted %s to %d records", self.path, len(messages))
+
+    def _maybe_fsync(self, f):
+        if self.fsync_policy == "never":
+            return
+        now = time.time()
+        if self.fsync_policy == "always" or now - self._last_fsync >= self.fsync_interval:
+            f.flush()
+            os.fsync(f.fileno())
+            self._last_fsync = now
+
+
+def write_json_atomic(path, data, fsync=True):
+    """Replace path with data as JSON: written to a temp file first, so a crash never leaves it half written."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def migrate_legacy_history(json_path, fsync_policy="interval", fsync_interval=5.0):
+    """
+    Convert an old pretty-printed chat_<ts>.json history into chat_<ts>.jsonl.
+    Returns the new store with the conversation loaded.
+    """
+    with open(json_path, "r") as f:
+        messages = json.load(f)
+    store = HistoryStore(os.path.splitext(json_path)[0] + ".jsonl", fsync_policy, fsync_interval)
+    store.compact(messages)
+    # Only drop the old file once the new one is safely on disk
+    os.remove(json_path)
+    debug("Migrated %s to %s", json_path, store.path)
+    return store, messages
@@ -1,31 +1,59 @@
+import time
+# Startup is timed from here, so the imports below are part of it
+STARTED = time.perf_counter()
 import urwid
+import asyncio
 import os
+import queue
+import threading
 from config import Config
-from debug import clear_debug_log, debug
-from chat_logic import ChatManager
-from chat_screen import ChatScreen
+from debug import debug, setup_logging, shutdown_logging, PhaseTimer
+from chat_logic import ChatManager, get_history_index, backfill_search_index, flush_pending_saves, archive_old_chats
+from ollama_client import create_client
+from model_catalog import ModelCatalog
+from request_executor import RequestExecutor
 from themes_manager import Themes
 from menu import Menu
-from ui_elements import CustomEdit
+from ui_elements import CustomEdit, SessionBar
 import json
 from datetime import datetime
 
-from classes.about_menu import AboutMenu
-from classes.history_menu import HistoryMenu
-from classes.help_menu import HelpMenu
-from classes.model_menu import ModelMenu
-from classes.chat_settings_menu import ChatSettingsMenu
-from classes.config_menu import ModelSelectionMenu
-from classes.config_menu import ThemeSelectionMenu
-from classes.config_menu import ConfigMenu
+# Seconds quit_app waits for cancelled replies to save their partial text
+QUIT_TIMEOUT = 5
+
+# Only the main menu is needed for the first frame: the chat screen and the
+# classes/ menus are imported and built the first time they are shown.
 
 class Application:
-    def __init__(self):
-        clear_debug_log()
+    def __init__(self, started=None):
+        # Phases logged (info level) once the main menu is on screen
+        self.startup = PhaseTimer("Startup", started)
+        self.startup.mark("imports")
         self.config = Config()
+        setup_logging(
+            enabled=self.config.debug_log,
+            level=self.config.debug_log_level,
+            max_bytes=self.config.debug_log_max_bytes
+        )
+        self.startup.mark("config")
+        # Everything (UI, requests to Ollama, model listing) runs on this one event loop
+        self.event_loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.event_loop)
         self.loop = None
-        self.chat_manager = None
+        self.wake_pipe = None
+        self.pending_calls = queue.Queue()
+        self.ollama_client = None
+        self.model_catalog = ModelCatalog(self.get_client, ttl=self.config.model_list_ttl)
+        self.request_executor = RequestExecutor(
+            max_concurrent=self.config.max_concurrent_generations,
+            on_change=lambda: self.call_soon(self.refresh_sessions)
+        )
+        # Open chats; each keeps generating in the background while another is on screen
+        self.sessions = []
+        self.session_bar = SessionBar("")
+        self.chat_manager = None  # The chat on screen (or last shown)
         self.chat_screen = None
+        self.search_backfilled = False
 
         self.menu = Menu(
             config=self.config,
@@ -35,16 +63,10 @@ class Application:
             on_show_help=self.show_help_menu,
             on_show_model_menu=self.show_model_menu,
             on_show_about=self.show_about_menu,
-            on_show_config=self.show_config_menu
-        )
-
-        self.history_menu = HistoryMenu(
-            on_select_chat=self.resume_chat,
-            on_back=self.back_to_main_menu
-        )
-
-        self.help_menu = HelpMenu(
-            on_back=self.back_to_main_menu
+            on_show_config=self.show_config_menu,
+            on_show_search=self.show_search_menu,
+            on_show_sessions=self.show_sessions,
+            on_show_stats=self.show_model_stats
         )
 
         self.view = self.menu.widget()
@@ -65,66 +87,235 @@ class Application:
         self.themes = Themes(default_palette=self.default_palette)
         self.themes.load_theme(self.config.theme)  # e.g., "0" means 0.json
         self.palette = self.themes._merge_palette()  # Merge default with loaded theme
+        self.startup.mark("main menu")
+
+    def get_client(self):
+        """Shared Ollama client, rebuilt only when the configured host changes."""
+        if self.ollama_client is None or self.ollama_client.host != self.config.ollama_host:
+            old_client = self.ollama_client
+            self.ollama_client = create_client(self.config)
+            if old_client is not None:
+                # Open chats move to the new server, and the old connection pool is closed
+                for chat_screen in self.sessions:
+                    if chat_screen.chat_manager.client is old_client:
+                        chat_screen.chat_manager.client = self.ollama_client
+                self.event_loop.create_task(old_client.close())
+        return self.ollama_client
+
+    def call_soon(self, callback, *args):
+        """
+        Run callback(*args) on the urwid main loop and redraw the screen afterwards.
+        Used by event loop tasks, and safe to call from worker threads too.
+        """
+        self.pending_calls.put((callback, args))
+        if self.wake_pipe is not None:
+            os.write(self.wake_pipe, b"!")  # Wakes the main loop even when it is idle
+
+    def _run_pending_calls(self, data):
+        while True:
+            try:
+                callback, args = self.pending_calls.get_nowait()
+            except queue.Empty:
+                break
+            callback(*args)
+        return True  # Keep the pipe open
+
+    def new_chat_manager(self, model_name):
+        return ChatManager(
+            host=self.config.ollama_host,
+            model_name=model_name,
+            config=self.config,
+            client=self.get_client(),
+            executor=self.request_executor
+        )
 
     def start_chat_with_model(self, model_name=None):
         if model_name is None:
             # Use default model from config
             model_name = self.config.model_name
-        # Start a new empty conversation
-        self.chat_manager = ChatManager(host=self.config.ollama_host, model_name=model_name)
-        self.chat_screen = ChatScreen(self.loop, self.chat_manager, self.config, self.quit_app)
-        self.view = self.chat_screen.widget()
+        from chat_screen import ChatScreen
+        # Start a new empty conversation next to the open ones
+        chat_manager = self.new_chat_manager(model_name)
+        self.open_session(ChatScreen(self.loop, chat_manager, self.config, self.quit_app, self.call_soon))
+        debug("Chat started with model: %s", model_name)
+        self.warm_up(chat_manager)
+
+    def resume_chat(self, filename, focus_message=None):
+        # A chat that is already open is shown as it is (it may still be generating)
+        stem = os.path.splitext(filename)[0]
+        for chat_screen in self.sessions:
+            history_file = chat_screen.chat_manager.current_history_file
+            if history_file and os.path.splitext(os.path.basename(history_file))[0] == stem:
+                self.show_session(chat_screen)
+                chat_screen.show_message(focus_message)
+                return
+
+        from chat_screen import ChatScreen
+        chat_manager = self.new_chat_manager(self.config.model_name)
+        chat_manager.load_conversation(filename)
+        chat_manager.load_conversation_details(filename)  # Load model and other details
+        # Now chat_manager.model_name reflects the model previously used
+        self.open_session(ChatScreen(self.loop, chat_manager, self.config, self.quit_app,
+                                     self.call_soon, focus_message=focus_message))
+        debug("Resumed chat from %s with model: %s", filename, chat_manager.model_name)
+        self.warm_up(chat_manager)
+
+    def warm_up(self, chat_manager):
+        # Load the chat's model while the user types the first message
+        if self.config.warm_up_models and chat_manager.model_name:
+            chat_manager.warm_up(on_done=lambda: self.model_catalog.refresh_running())
+
+    def open_session(self, chat_screen):
+        chat_screen.on_state_change = lambda screen: self.refresh_sessions()
+        self.sessions.append(chat_screen)
+        self.show_session(chat_screen)
+
+    def show_session(self, chat_screen):
+        self.chat_screen = chat_screen
+        self.chat_manager = chat_screen.chat_manager
+        chat_screen.unread = False
+        self.view = chat_screen.widget()
         self.loop.widget = self.view
-        self.chat_screen.update_focus_style()
-        debug(f"Chat started with model: {model_name}")
-
-    def resume_chat(self, filename):
-        # Load a saved conversation and resume chat
-        self.chat_manager = ChatManager(host=self.config.ollama_host, model_name=self.config.model_name)
-        self.chat_manager.load_conversation(filename)
-        self.chat_screen = ChatScreen(self.loop, self.chat_manager, self.config, self.quit_app)
-        self.view = self.chat_screen.widget()
-        self.loop.widget = self.view
-        self.chat_screen.update_focus_style()
-        debug(f"Resumed chat from {filename}.")
-
-    def resume_chat(self, filename):
-        self.chat_manager = ChatManager(host=self.config.ollama_host, model_name=self.config.model_name)
-        self.chat_manager.load_conversation(filename)
-        self.chat_manager.load_conversation_details(filename)  # Load model and other details
-        # Now self.chat_manager.model_name should reflect the model previously used
-        # Recreate the ChatScreen with the updated model name
-        self.chat_screen = ChatScreen(self.loop, self.chat_manager, self.config, self.quit_app)
-        self.view = self.chat_screen.widget()
-        self.loop.widget = self.view
-        self.chat_screen.update_focus_style()
-        debug(f"Resumed chat from {filename} with model: {self.chat_manager.model_name}")
+        chat_screen.update_focus_style()
+        self.refresh_sessions()
+
+    def show_sessions(self):
+        # Main menu "Open Chats": back to the chat shown last
+        if self.chat_screen in self.sessions:
+            self.show_session(self.chat_screen)
+        elif self.sessions:
+            self.show_session(self.sessions[-1])
+
+    def switch_session(self, step):
+        if len(self.sessions) > 1:
+            index = self.sessions.index(self.chat_screen)
+            self.show_session(self.sessions[(index + step) % len(self.sessions)])
+
+    def close_session(self, chat_screen):
+        # A reply nobody will read anymore only wastes server time
+        chat_screen.chat_manager.cancel_generation()
+        index = self.sessions.index(chat_screen)
+        self.sessions.remove(chat_screen)
+        chat_screen.set_session_bar(None)
+        if chat_screen is self.chat_screen:
+            if self.sessions:
+                self.show_session(self.sessions[min(index, len(self.sessions) - 1)])
+            else:
+                self.chat_screen = None
+                self.chat_manager = None
+                self.back_to_main_menu()
+        self.refresh_sessions()
+
+    def refresh_sessions(self):
+        """Redraw the session bar and the open chats count after any state change."""
+        if self.chat_screen is not None and self.view == self.chat_screen.widget():
+            self.chat_screen.unread = False  # Its reply is on screen, so it has been seen
+        self.session_bar.update(
+            [(s.session_label(), s.session_state()) for s in self.sessions],
+            self.sessions.index(self.chat_screen) if self.chat_screen in self.sessions else -1
+        )
+        for chat_screen in self.sessions:
+            chat_screen.set_session_bar(self.session_bar if len(self.sessions) > 1 else None)
+        self.menu.set_open_chats(len(self.sessions))
 
     def show_history_menu(self):
-        files = self.chat_manager.list_saved_chats() if self.chat_manager else ChatManager.list_saved_chats()
-        self.history_menu.populate(files)
+        if not hasattr(self, 'history_menu'):
+            from classes.history_menu import HistoryMenu
+            self.history_menu = HistoryMenu(
+                on_select_chat=self.resume_chat,
+                on_back=self.back_to_main_menu
+            )
+        # The catalogue is paged lazily, so no chat files are opened here
+        self.history_menu.populate(get_history_index())
         self.view = self.history_menu.widget()
         self.loop.widget = self.view
 
+    def show_search_menu(self):
+        from classes.search_menu import SearchMenu
+        self.search_menu = SearchMenu(
+            search=get_history_index().search,
+            on_select_result=self.open_search_result,
+            on_back=self.back_to_main_menu
+        )
+        self.view = self.search_menu.widget()
+        self.loop.widget = self.view
+
+        if not self.search_backfilled:
+            # Index chats saved before search existed, without blocking the screen
+            self.search_backfilled = True
+            menu = self.search_menu
+            threading.Thread(
+                target=backfill_search_index,
+                args=(lambda count: self.call_soon(menu.indexing_done, count),),
+                daemon=True
+            ).start()
+
+    def open_search_result(self, filename, position):
+        self.resume_chat(filename, focus_message=position)
+
+    def show_chat_stats(self):
+        from classes.stats_menu import StatsMenu
+        self.stats_menu = StatsMenu("Chat Stats", self.chat_manager.chat_stats(), on_back=self.back_to_chat)
+        self.view = self.stats_menu.widget()
+        self.loop.widget = self.view
+
+    def show_model_stats(self):
+        from classes.stats_menu import StatsMenu
+        # Every reply of every chat, aggregated per model from the history index
+        self.stats_menu = StatsMenu("Model Stats", get_history_index().model_stats(), on_back=self.back_to_main_menu)
+        self.view = self.stats_menu.widget()
+        self.loop.widget = self.view
+
     def show_help_menu(self):
+        if not hasattr(self, 'help_menu'):
+            from classes.help_menu import HelpMenu
+            self.help_menu = HelpMenu(on_back=self.back_to_main_menu)
         # Show the help screen
         self.view = self.help_menu.widget()
         self.loop.widget = self.view
 
     def show_model_menu(self):
-        # Create a temporary ChatManager just to list models if self.chat_manager is None
-        temp_manager = ChatManager(host=self.config.ollama_host, model_name=self.config.model_name)
-        models = temp_manager.list_available_models()
+        from classes.model_menu import ModelMenu
+        # Render from the cached model list; a fresh list replaces it when it arrives
         self.model_menu = ModelMenu(
-            models=models,
+            models=self.model_catalog.models,
             on_select_model=self.start_chat_with_model,
             on_back=self.back_to_main_menu,
-            config_model=self.config.model_name
+            config_model=self.config.model_name,
+            loading=not self.model_catalog.loaded,
+            running=self.model_catalog.running
         )
+        self.model_catalog.refresh(on_update=self._models_updater(self.model_menu))
+        menu = self.model_menu
+        self.model_catalog.refresh_running(on_update=lambda running: self.call_soon(menu.set_running, running))
         self.view = self.model_menu.widget()
         self.loop.widget = self.view
 
+    def show_compare_menu(self):
+        from classes.compare_menu import CompareMenu
+        # Pick the models the current chat sends each message to
+        self.compare_menu = CompareMenu(
+            models=self.model_catalog.models,
+            selected=self.chat_screen.compare_models,
+            on_done=self.set_compare_models,
+            on_back=self.back_to_chat,
+            loading=not self.model_catalog.loaded
+        )
+        self.model_catalog.refresh(on_update=self._models_updater(self.compare_menu))
+        self.view = self.compare_menu.widget()
+        self.loop.widget = self.view
+
+    def set_compare_models(self, models):
+        self.chat_screen.set_compare_models(models)
+        debug("Compare mode models: %s", models)
+        self.back_to_chat()
+
+    def _models_updater(self, menu):
+        # Called from the catalog's refresh task when the new list arrives
+        return lambda models: self.call_soon(menu.set_models, models)
+
     def show_chat_settings(self):
+        from classes.chat_settings_menu import ChatSettingsMenu
         # This assumes we are currently in a chat
         # We can access self.chat_manager.chat_name for current name
         current_name = self.chat_manager.chat_name
@@ -143,12 +334,13 @@ class Application:
         self.back_to_chat()
 
     def show_config_menu(self):
-        temp_manager = ChatManager(host=self.config.ollama_host, model_name=self.config.model_name)
-        models = temp_manager.list_available_models()
+        from classes.config_menu import ConfigMenu
+        # Warm the model cache for the model selection submenu
+        self.model_catalog.refresh()
 
         self.config_menu = ConfigMenu(
             config=self.config,
-            models=models,
+            models=self.model_catalog.models,
             on_save=self.save_config_changes,
             on_back=self.back_to_main_menu,
             on_select_model=self.show_model_selection_menu,
@@ -158,15 +350,15 @@ class Application:
         self.loop.widget = self.view
 
     def show_model_selection_menu(self):
+        from classes.config_menu import ModelSelectionMenu
         # Show model selection menu
-        temp_manager = ChatManager(host=self.config.ollama_host, model_name=self.config.model_name)
-        models = temp_manager.list_available_models()
-
         self.model_selection_menu = ModelSelectionMenu(
-            models=models,
+            models=self.model_catalog.models,
             on_select=self.model_selected,
-            on_back=self.back_to_config
+            on_back=self.back_to_config,
+            loading=not self.model_catalog.loaded
         )
+        self.model_catalog.refresh(on_update=self._models_updater(self.model_selection_menu))
         self.view = self.model_selection_menu.widget()
         self.loop.widget = self.view
 
@@ -177,6 +369,7 @@ class Application:
         self.back_to_config()
 
     def start_theme_selection(self):
+        from classes.config_menu import ThemeSelectionMenu
         self.theme_menu = ThemeSelectionMenu(
             themes_directory="./themes",
             on_select=self.apply_theme,
@@ -207,25 +400,43 @@ class Application:
         self.back_to_main_menu()       
 
     def show_about_menu(self):
+        from classes.about_menu import AboutMenu
         self.about_menu = AboutMenu(on_back=self.back_to_main_menu)
         self.view = self.about_menu.widget()
         self.loop.widget = self.view
 
     def delete_current_chat(self):
+        self.chat_manager.cancel_generation()
         self.chat_manager.delete_chat_files()
+        self.sessions.remove(self.chat_screen)
+        self.chat_screen = None
+        self.chat_manager = None
+        self.refresh_sessions()
         # After deleting the chat, return to main menu
         self.back_to_main_menu()
 
     def back_to_chat(self):
         # Return to the chat screen
-        self.view = self.chat_screen.widget()
-        self.loop.widget = self.view
+        self.show_session(self.chat_screen)
 
     def back_to_main_menu(self):
         self.view = self.menu.widget()
         self.loop.widget = self.view
 
     def quit_app(self):
+        # Cancelled replies save what they received so far in their CancelledError
+        # handlers, which only run on the next loop iterations: exit once they are done
+        tasks = self.request_executor.shutdown()
+        if tasks:
+            asyncio.ensure_future(self._exit_when_done(tasks))
+        else:
+            self._exit()
+
+    async def _exit_when_done(self, tasks):
+        await asyncio.wait(tasks, timeout=QUIT_TIMEOUT)
+        self._exit()
+
+    def _exit(self):
         try:
             raise urwid.ExitMainLoop()  # Exit Urwid main loop cleanly
         except urwid.ExitMainLoop:
@@ -233,25 +444,34 @@ class Application:
         finally:
             os.system('reset')  # Ensures terminal is fully reset
             debug("Terminal reset and cleared.")
+            # Chats are written in the background: put what is still queued on disk
+            flush_pending_saves()
+            shutdown_logging()
             # Force exit
             os._exit(0)
 
     def handle_input(self, key):
-        debug(f"Key pressed: {key}")
+        debug("Key pressed: %s", key)
         # Check menus with hasattr to avoid AttributeError
         if self.view == self.menu.widget():
             self.menu.handle_input(key)
         elif hasattr(self, 'history_menu') and self.view == self.history_menu.widget():
             self.history_menu.handle_input(key)
+        elif hasattr(self, 'search_menu') and self.view == self.search_menu.widget():
+            self.search_menu.handle_input(key)
         elif hasattr(self, 'about_menu') and self.view == self.about_menu.widget():
             self.about_menu.handle_input(key)
         elif hasattr(self, 'model_menu') and self.view == self.model_menu.widget():
             self.model_menu.handle_input(key)
+        elif hasattr(self, 'compare_menu') and self.view == self.compare_menu.widget():
+            self.compare_menu.handle_input(key)
+        elif hasattr(self, 'stats_menu') and self.view == self.stats_menu.widget():
+            self.stats_menu.handle_input(key)
         elif hasattr(self, 'config_menu') and self.view == self.config_menu.widget():
             self.config_menu.handle_input(key)
         elif hasattr(self, 'model_selection_menu') and self.view == self.model_selection_menu.widget():
             self.model_selection_menu.handle_input(key)
-        else:
+        elif self.chat_screen is not None and self.view == self.chat_screen.widget():
             # In chat screen
             if key == "ctrl w":
                 if self.view.focus_part == "footer":
@@ -265,15 +485,68 @@ class Application:
                 self.back_to_main_menu()
             elif key == "ctrl e":
                 self.show_chat_settings()
+            elif key == "ctrl k":
+                self.chat_screen.abort_generation()
+            elif key == "ctrl n":
+                self.switch_session(1)
+            elif key == "ctrl p":
+                self.switch_session(-1)
+            elif key == "ctrl x":
+                self.close_session(self.chat_screen)
+            elif key == "ctrl t":
+                self.show_compare_menu()
+            elif key == "meta s":
+                self.show_chat_stats()
             elif key == "meta h":
                 self.show_help_menu()
+        else:
+            # Screens without their own handler (Help, Chat Settings, Theme selection)
+            if key == "ctrl o":
+                self.quit_app()
+            elif key == "esc":
+                self.back_to_main_menu()
+
+
 
+    def filter_input(self, keys, raw):
+        # Any key while a reply is being typed out shows the rest of it at once;
+        # that key is consumed so it doesn't also land in the input box.
+        # Resizes and mouse events (tuples) always go through.
+        if self.chat_screen is not None and self.view == self.chat_screen.widget():
+            if any(self._is_keypress(k) for k in keys) and self.chat_screen.flush_typewriter():
+                return [k for k in keys if not self._is_keypress(k)]
+        return keys
 
+    @staticmethod
+    def _is_keypress(key):
+        return isinstance(key, str) and key != "window resize"
 
     def run(self):
-        self.loop = urwid.MainLoop(self.view, self.palette, unhandled_input=self.handle_input)
+        self.loop = urwid.MainLoop(
+            self.view,
+            self.palette,
+            unhandled_input=self.handle_input,
+            input_filter=self.filter_input,
+            event_loop=urwid.AsyncioEventLoop(loop=self.event_loop)
+        )
+        self.wake_pipe = self.loop.watch_pipe(self._run_pending_calls)
+        self.startup.mark("screen")
+        # Runs before the loop's own first redraw, so it paints the main menu itself
+        self.loop.set_alarm_in(0, self._after_first_frame)
         self.loop.run()
 
+    def _after_first_frame(self, loop, user_data):
+        self.loop.draw_screen()
+        self.startup.mark("first frame")
+        self.startup.log()
+        # Background work only starts once the main menu is on screen.
+        # Fetch the model list in the background so Start Chat opens instantly
+        # (building the first client is also what imports ollama)
+        self.model_catalog.refresh()
+        if self.config.archive_after_days:
+            # Move chats nobody touched for a while into the compressed archive
+            threading.Thread(target=archive_old_chats, args=(self.config,), daemon=True).start()
+
 if __name__ == "__main__":
-    app = Application()
+    app = Application(started=STARTED)
     app.run()
\ No newline at end of file
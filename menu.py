@@ -8,7 +8,7 @@ def menu_button(label, on_press_callback):
     return MenuItem(label, on_press_callback)
 
 class Menu:
-    def __init__(self, config, on_start_chat, on_quit, on_show_history, on_show_help, on_show_model_menu, on_show_about, on_show_config):
+    def __init__(self, config, on_start_chat, on_quit, on_show_history, on_show_help, on_show_model_menu, on_show_about, on_show_config, on_show_search=None, on_show_sessions=None, on_show_stats=None):
         self.config = config
         self.on_start_chat = on_start_chat
         self.on_quit = on_quit
@@ -17,15 +17,21 @@ class Menu:
         self.on_show_model_menu = on_show_model_menu
         self.on_show_about = on_show_about
         self.on_show_config = on_show_config
+        self.on_show_search = on_show_search
+        self.on_show_sessions = on_show_sessions
+        self.on_show_stats = on_show_stats
 
         start_chat_btn = menu_button(("menu_voice", "Start Chat"), lambda button: self.on_show_model_menu())
+        self.open_chats_btn = menu_button(("menu_voice", "Open Chats (0)"), lambda button: self.on_show_sessions())
         history_btn = menu_button(("menu_voice", "History"), lambda button: self.on_show_history())
+        search_btn = menu_button(("menu_voice", "Search"), lambda button: self.on_show_search())
+        stats_btn = menu_button(("menu_voice", "Model Stats"), lambda button: self.on_show_stats())
         help_btn = menu_button(("menu_voice", "Help"), lambda button: self.on_show_help())
         quit_btn = menu_button(("normal_content", "Quit"), lambda button: self.on_quit())
         about_btn = menu_button(("menu_voice", "About"), lambda button: self.on_show_about())
         config_btn = menu_button(("menu_voice", "Configuration"), lambda button: self.on_show_config())
 
-        menu_items = [start_chat_btn, history_btn, config_btn, help_btn, about_btn, quit_btn]
+        menu_items = [start_chat_btn, self.open_chats_btn, history_btn, search_btn, stats_btn, config_btn, help_btn, about_btn, quit_btn]
         self.list_walker = urwid.SimpleFocusListWalker(menu_items)
         # Add a footer text to the menu
         footer_text = urwid.Text("SheLLMind - TheLabExpedition67", align='right')
@@ -33,6 +39,9 @@ class Menu:
         line_box = urwid.LineBox(frame, title="Menu")
         self.view = urwid.AttrMap(line_box, 'focus_linebox_border')
 
+    def set_open_chats(self, count):
+        self.open_chats_btn.set_label(("menu_voice", f"Open Chats ({count})"))
+
     def widget(self):
         return self.view
 
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from chat_logic import ChatManager
+from debug import debug, warning
+
+# After a failed refresh, wait this long before asking the server again
+RETRY_AFTER_ERROR = 5
+
+
+class ModelCatalog:
+    """
+    TTL-cached list of the models available on the Ollama server.
+
+    Menus render straight from the cached list and call refresh(); when the cache
+    is stale a background task fetches a fresh list and hands it to the
+    on_update callbacks, so the urwid main loop never waits on the server.
+
+    It also tracks which models are loaded in the server's memory (running),
+    which changes too often to cache: refresh_running() always asks again.
+    """
+
+    def __init__(self, get_client, ttl=60):
+        self.get_client = get_client
+        self.ttl = ttl
+        self.models = []
+        self.loaded = False      # True once at least one refresh has finished
+        self.error = None        # Last refresh error, if any
+        self.host = None
+        self.updated_at = 0
+        self._refreshing = False
+        self._listeners = []
+        self.running = {}        # Loaded models: {name: expires_at}
+
+    def is_stale(self):
+        return time.time() - self.updated_at >= self.ttl
+
+    def refresh(self, on_update=None, force=False):
+        """
+        Start a background refresh if the cached list is stale (or force is set).
+        on_update(models) is called from the background task when it finishes.
+        """
+        client = self.get_client()
+        if client.host != self.host:
+            # Different server: the cached list no longer applies
+            self.host = client.host
+            self.models = []
+            self.loaded = False
+            self.updated_at = 0
+        if not force and not self.is_stale():
+            return
+        if on_update is not None:
+            self._listeners.append(on_update)
+        if self._refreshing:
+            return  # The running refresh will notify this listener too
+        self._refreshing = True
+        asyncio.ensure_future(self._refresh(client))
+
+    def refresh_running(self, on_update=None):
+        """Fetch the loaded models in the background; on_update(running) is called when done."""
+        asyncio.ensure_future(self._refresh_running(self.get_client(), on_update))
+
+    async def _refresh_running(self, client, on_update):
+        try:
+            running = await ChatManager.fetch_running_models(client)
+        except Exception as e:
+            # Older servers have no running-models endpoint; just show nothing
+            debug("Running models unavailable: %s", e)
+            running = {}
+        if client.host == self.get_client().host:
+            self.running = running
+        if on_update is not None:
+            on_update(dict(self.running))
+
+    async def _refresh(self, client):
+        started = time.time()
+        try:
+            models = await ChatManager.fetch_model_names(client)
+            if client.host == self.host:
+                self.models = models
+                self.error = None
+                self.updated_at = time.time()
+            debug("Model list refreshed in %.2fs: %d models", time.time() - started, len(models))
+        except Exception as e:
+            # Keep serving the last known list; try again shortly
+            warning("Model list refresh failed: %s", e)
+            self.error = str(e)
+            self.updated_at = time.time() - self.ttl + RETRY_AFTER_ERROR
+        finally:
+            self.loaded = True
+            self._refreshing = False
+            listeners, self._listeners = self._listeners, []
+            models = list(self.models)
+
+        for listener in listeners:
+            listener(models)
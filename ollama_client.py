@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+from debug import warning
+
+# ollama (with the pydantic models it builds on import) and httpx are the slowest
+# imports of the application, so they are only imported once the first client is
+# built, after the main menu is on screen.
+
+
+def _retryable_errors():
+    # Errors raised before the server has produced anything, so the request can safely be sent again.
+    # RemoteProtocolError covers a pooled keep-alive connection the server already closed.
+    import httpx
+    return (
+        ConnectionError,
+        httpx.ConnectError,
+        httpx.ConnectTimeout,
+        httpx.PoolTimeout,
+        httpx.RemoteProtocolError
+    )
+
+
+def _is_retryable(error):
+    from ollama import ResponseError
+    if isinstance(error, ResponseError):
+        return error.status_code == 503  # Server busy
+    return isinstance(error, _retryable_errors())
+
+
+class OllamaClient:
+    """
+    Thin wrapper around ollama.AsyncClient shared by the whole application.
+    All methods are coroutines and run on the application's event loop.
+
+    The underlying httpx client keeps a pool of keep-alive connections to the
+    server, so menus and chats reuse the same TCP connections. Requests that fail
+    before any data arrives are retried with exponential backoff.
+    """
+
+    def __init__(self, host, timeout=300, connect_timeout=5, retries=2, backoff=0.5, pool_size=4):
+        self.host = host
+        self.retries = retries
+        self.backoff = backoff
+        import httpx
+        from ollama import AsyncClient
+        self._client = AsyncClient(
+            host=host,
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=pool_size,
+                keepalive_expiry=60
+            )
+        )
+
+    async def _with_retries(self, request):
+        for attempt in itertools.count():
+            try:
+                return await request()
+            except Exception as e:
+                if attempt >= self.retries or not _is_retryable(e):
+                    raise
+                delay = self.backoff * (2 ** attempt)
+                warning("Ollama request failed (%s), retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+
+    async def _stream_with_retries(self, request):
+        # The HTTP request is only sent when the first chunk is read, so that
+        # first read is the part that gets retried
+        async def start():
+            stream = await request()
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+
+        stream, first = await self._with_retries(start)
+        try:
+            if first is not None:
+                yield first
+                async for chunk in stream:
+                    yield chunk
+        finally:
+            # Also runs when the caller stops early (a cancelled reply): closing
+            # the response drops the connection, so the server stops generating
+            await stream.aclose()
+
+    async def chat(self, **kwargs):
+        """Like ollama.AsyncClient.chat: with stream=True the result is an async iterator of chunks."""
+        if kwargs.get("stream"):
+            return self._stream_with_retries(lambda: self._client.chat(**kwargs))
+        return await self._with_retries(lambda: self._client.chat(**kwargs))
+
+    async def generate(self, **kwargs):
+        if kwargs.get("stream"):
+            return self._stream_with_retries(lambda: self._client.generate(**kwargs))
+        return await self._with_retries(lambda: self._client.generate(**kwargs))
+
+    async def list(self):
+        return await self._with_retries(self._client.list)
+
+    async def ps(self):
+        return await self._with_retries(self._client.ps)
+
+    async def close(self):
+        await self._client.close()
+
+
+def create_client(config):
+    """Build the shared client from the connection settings in config.json."""
+    return OllamaClient(
+        host=config.ollama_host,
+        timeout=config.request_timeout,
+        connect_timeout=config.connect_timeout,
+        retries=config.request_retries,
+        backoff=config.retry_backoff,
+        pool_size=config.connection_pool_size
+    )
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+from debug import debug, error
+
+
+class PersistenceWorker:
+    """
+    Background thread that does the disk writes for saved chats, so neither the
+    UI nor the event loop waits on the disk.
+
+    Jobs are queued by key (one per file). A job queued while an older one for
+    the same key is still waiting replaces it: only the latest snapshot of a
+    chat gets written, however many saves happened in between. flush() waits
+    until everything queued so far is on disk; the application calls it before
+    quitting.
+    """
+
+    def __init__(self):
+        self._pending = OrderedDict()   # key -> (fn, args)
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self.coalesced = 0              # Saves merged into a newer one
+        self._thread = threading.Thread(target=self._run, name="persistence", daemon=True)
+        self._thread.start()
+
+    def submit(self, key, fn, *args):
+        """Queue fn(*args) to run on the worker, replacing a job for key that hasn't started yet."""
+        with self._cond:
+            if key in self._pending:
+                self.coalesced += 1
+            self._pending[key] = (fn, args)
+            self._cond.notify_all()
+
+    def discard(self, key):
+        """Drop the queued job for key (e.g. its file is about to be deleted)."""
+        with self._cond:
+            self._pending.pop(key, None)
+
+    def flush(self, timeout=None):
+        """Wait until every queued job has been written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def shutdown(self, timeout=10):
+        """Write what is still queued and stop the thread."""
+        flushed = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        debug("Persistence worker stopped (%d saves coalesced)", self.coalesced)
+        return flushed
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                key, (fn, args) = self._pending.popitem(last=False)
+                self._busy = True
+            try:
+                fn(*args)
+            except Exception as e:
+                # Keep the worker alive; the next save of this chat writes the changes again
+                error("Saving %s failed: %s", key, e)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
@@ -0,0 +1,107 @@
+import asyncio
+from debug import debug, error
+
+
+class RequestHandle:
+    """
+    Handle of a request running on the RequestExecutor.
+
+    The request runs as an asyncio task. It waits for a free slot with
+    "async with handle:" and then talks to the server. cancel() (or the
+    deadline passing) cancels the task wherever it is waiting, which also
+    closes an open stream, so the server stops generating. The request sees
+    asyncio.CancelledError and tells the two cases apart with timed_out.
+    """
+
+    def __init__(self, name, executor, timeout=None):
+        self.name = name
+        self.timeout = timeout
+        self.task = None
+        self.started = False     # Holds a slot (False while queued behind other requests)
+        self.cancelled = False   # Cancelled by the user
+        self.timed_out = False   # Ran past its deadline
+        self._executor = executor
+        self._deadline = None
+
+    def cancel(self):
+        if self.task is not None and not self.task.done():
+            self.cancelled = True
+            self.task.cancel()
+
+    def done(self):
+        return self.task is not None and self.task.done()
+
+    def _expire(self):
+        if not self.task.done():
+            self.timed_out = True
+            self.task.cancel()
+
+    async def __aenter__(self):
+        await self._executor.slots.acquire()
+        self.started = True
+        self._executor._changed()
+        if self.timeout:
+            # The time limit covers the generation, not the wait for a slot
+            self._deadline = asyncio.get_running_loop().call_later(self.timeout, self._expire)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self._deadline is not None:
+            self._deadline.cancel()
+        self._executor.slots.release()
+        return False
+
+
+class RequestExecutor:
+    """
+    Runs requests to the Ollama server as tasks on the application's event loop,
+    at most max_concurrent of them talking to the server at a time; the rest
+    wait in line. This is the cap for the whole application, shared by all chats.
+    Every submitted request gets a RequestHandle to cancel it with.
+
+    on_change() is called whenever a request is queued, starts or finishes.
+    """
+
+    def __init__(self, max_concurrent=2, on_change=None):
+        self.max_concurrent = max(1, max_concurrent)
+        self.slots = asyncio.Semaphore(self.max_concurrent)
+        self.on_change = on_change
+        self._active = set()
+
+    def submit(self, name, fn, *args, timeout=None):
+        """Run the coroutine fn(handle, *args). fn is expected to report its own errors."""
+        handle = RequestHandle(name, self, timeout)
+        handle.task = asyncio.ensure_future(fn(handle, *args))
+        handle.task.add_done_callback(lambda task: self._finished(handle))
+        self._active.add(handle)
+        self._changed()
+        return handle
+
+    def running(self):
+        """Number of requests holding a slot."""
+        return sum(1 for handle in self._active if handle.started)
+
+    def queued(self):
+        return sum(1 for handle in self._active if not handle.started)
+
+    def _changed(self):
+        if self.on_change is not None:
+            self.on_change()
+
+    def _finished(self, handle):
+        self._active.discard(handle)
+        if not handle.task.cancelled() and handle.task.exception() is not None:
+            error("Request %s failed: %s", handle.name, handle.task.exception())
+        self._changed()
+
+    def cancel_all(self):
+        """Cancel every request; returns their tasks, to wait for their cleanup to run."""
+        active = list(self._active)
+        for handle in active:
+            handle.cancel()
+        if active:
+            debug("Cancelled %d running requests", len(active))
+        return [handle.task for handle in active]
+
+    def shutdown(self):
+        return self.cancel_all()
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from debug import debug, warning
+
+
+def cache_key(model, options, messages):
+    """Hash identifying a request: same model, generation options and messages give the same key."""
+    payload = json.dumps({"model": model, "options": options, "messages": messages},
+                         sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk (SQLite) cache of complete replies, keyed by cache_key().
+
+    Entries older than max_age seconds are dropped, and once the stored replies
+    take more than max_bytes the least recently used ones go first.
+    """
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, max_age=7 * 24 * 3600):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS replies (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL DEFAULT '',
+                reply TEXT NOT NULL,
+                stats TEXT NOT NULL DEFAULT '{}',
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS replies_by_last_used ON replies (last_used);
+        """)
+        self._db.commit()
+        self.evict()
+
+    def get(self, key):
+        """(reply, stats of the original generation) or None."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT reply, stats, created FROM replies WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.max_age and row[2] < now - self.max_age:
+                self._db.execute("DELETE FROM replies WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE replies SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return row[0], json.loads(row[1])
+
+    def put(self, key, model, reply, stats):
+        now = time.time()
+        size = len(reply.encode("utf-8"))
+        with self._lock:
+            self._db.execute("""
+                INSERT OR REPLACE INTO replies (key, model, reply, stats, size, created, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (key, model, reply, json.dumps(stats), size, now, now))
+            self._db.commit()
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the least recently used ones until the cache fits max_bytes."""
+        try:
+            with self._lock:
+                if self.max_age:
+                    self._db.execute("DELETE FROM replies WHERE created < ?", (time.time() - self.max_age,))
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM replies").fetchone()[0]
+                if self.max_bytes and total > self.max_bytes:
+                    dropped = 0
+                    for key, size in self._db.execute("SELECT key, size FROM replies ORDER BY last_used").fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        self._db.execute("DELETE FROM replies WHERE key = ?", (key,))
+                        total -= size
+                        dropped += 1
+                    debug("Response cache over %d bytes: dropped %d replies", self.max_bytes, dropped)
+                self._db.commit()
+        except sqlite3.Error as e:
+            warning("Response cache eviction failed: %s", e)
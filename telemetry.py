@@ -0,0 +1,104 @@
+import time
+
+# Timing counters Ollama reports on the last chunk of a reply (durations in nanoseconds)
+SERVER_FIELDS = (
+    "total_duration",
+    "load_duration",
+    "prompt_eval_count",
+    "prompt_eval_duration",
+    "eval_count",
+    "eval_duration"
+)
+
+# A load_duration above this (seconds) means the model had to be loaded for the turn
+COLD_LOAD_SECONDS = 0.5
+
+
+def _seconds(nanoseconds):
+    return nanoseconds / 1e9 if nanoseconds else 0.0
+
+
+def reply_stats(started, first_token_time, chunk_count, final_chunk, model=None):
+    """
+    Stats of one reply: the server counters from the final chunk plus what the
+    client measured (total_time, time_to_first_token) and derived rates.
+    Stored with the assistant message under "stats".
+    """
+    finished = time.time()
+    stats = {
+        "model": model,
+        "created": finished,
+        "total_time": finished - started,
+        "time_to_first_token": (first_token_time - started) if first_token_time else None,
+        "tokens_per_sec": None,
+        "prompt_tokens_per_sec": None
+    }
+    for field in SERVER_FIELDS:
+        stats[field] = final_chunk.get(field) if final_chunk else None
+
+    # Prefer the server-side counters; fall back to counting streamed chunks
+    if stats["eval_count"] and stats["eval_duration"]:
+        stats["tokens_per_sec"] = stats["eval_count"] / _seconds(stats["eval_duration"])
+    elif first_token_time and finished > first_token_time:
+        stats["tokens_per_sec"] = chunk_count / (finished - first_token_time)
+    if stats["prompt_eval_count"] and stats["prompt_eval_duration"]:
+        stats["prompt_tokens_per_sec"] = stats["prompt_eval_count"] / _seconds(stats["prompt_eval_duration"])
+    return stats
+
+
+def is_cold_load(stats):
+    return _seconds(stats.get("load_duration")) >= COLD_LOAD_SECONDS
+
+
+def format_stats(stats):
+    """Short one-line summary: latency, time to first token, speed and a cold load note."""
+    if stats.get("cached"):
+        return "cached reply"
+    details = [f"{stats['total_time']:.2f}s"]
+    if stats.get("time_to_first_token") is not None:
+        details.append(f"{stats['time_to_first_token']:.2f}s to first token")
+    if stats.get("tokens_per_sec") is not None:
+        details.append(f"{stats['tokens_per_sec']:.1f} tok/s")
+    if is_cold_load(stats):
+        details.append(f"model load {_seconds(stats['load_duration']):.1f}s")
+    return ", ".join(details)
+
+
+def aggregate(stats_list):
+    """Totals and averages over many replies' stats (a chat, or one model's turns)."""
+    stats_list = [s for s in stats_list if s]
+
+    def average(key):
+        values = [s[key] for s in stats_list if s.get(key) is not None]
+        return sum(values) / len(values) if values else None
+
+    return {
+        "turns": len(stats_list),
+        "avg_total_time": average("total_time"),
+        "avg_time_to_first_token": average("time_to_first_token"),
+        "avg_tokens_per_sec": average("tokens_per_sec"),
+        "avg_prompt_tokens_per_sec": average("prompt_tokens_per_sec"),
+        "prompt_tokens": sum(s.get("prompt_eval_count") or 0 for s in stats_list),
+        "generated_tokens": sum(s.get("eval_count") or 0 for s in stats_list),
+        "context_tokens": sum(s.get("context_tokens") or 0 for s in stats_list),
+        "cold_loads": sum(1 for s in stats_list if is_cold_load(s))
+    }
+
+
+def format_aggregate(name, totals):
+    """Lines describing an aggregate() result, for the stats screens."""
+    def value(number, unit, digits=2):
+        return f"{number:.{digits}f}{unit}" if number is not None else "-"
+
+    return [
+        f"{name}",
+        f"  Replies: {totals['turns']}   Cold loads: {totals['cold_loads']}",
+        f"  Avg latency: {value(totals['avg_total_time'], 's')}   "
+        f"Avg time to first token: {value(totals['avg_time_to_first_token'], 's')}",
+        f"  Avg speed: {value(totals['avg_tokens_per_sec'], ' tok/s', 1)}   "
+        f"Avg prompt speed: {value(totals['avg_prompt_tokens_per_sec'], ' tok/s', 1)}",
+        f"  Tokens: {totals['prompt_tokens']} prompt, {totals['generated_tokens']} generated"
+    ] + ([
+        # Well below the estimate means the server reused its cached prefix
+        f"  Prompt tokens evaluated: {totals['prompt_tokens']} of ~{totals['context_tokens']} sent"
+    ] if totals.get("context_tokens") else [])
@@ -0,0 +1,29 @@
+import os
+import sys
+
+# The application modules live in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+import chat_logic
+from config import Config
+
+
+@pytest.fixture
+def history_env(tmp_path, monkeypatch):
+    """chat_logic storage in a temporary folder, and a Config of its own there."""
+    history_dir = tmp_path / "history"
+    details_dir = tmp_path / "history_details"
+    history_dir.mkdir()
+    details_dir.mkdir()
+    monkeypatch.setattr(chat_logic, "HISTORY_DIR", str(history_dir))
+    monkeypatch.setattr(chat_logic, "HISTORY_DETAILS_DIR", str(details_dir))
+    monkeypatch.setattr(chat_logic, "HISTORY_INDEX_FILE", str(history_dir / "index.db"))
+    monkeypatch.setattr(chat_logic, "ARCHIVE_DIR", str(history_dir / "archive"))
+    monkeypatch.setattr(chat_logic, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(chat_logic, "RESPONSE_CACHE_FILE", str(tmp_path / "cache" / "responses.db"))
+    for name in ("_history_index", "_persistence_worker", "_response_cache", "_archive_store"):
+        monkeypatch.setattr(chat_logic, name, None)
+    monkeypatch.setattr(chat_logic, "_open_chats", set())
+    yield Config(str(tmp_path / "config.json"))
+    chat_logic.flush_pending_saves()
@@ -0,0 +1,55 @@
+import json
+import os
+import time
+import chat_logic
+from history_store import HistoryStore
+
+
+def write_old_chat(stem, days_old=30):
+    path = os.path.join(chat_logic.HISTORY_DIR, f"{stem}.jsonl")
+    HistoryStore(path).compact([{"role": "user", "content": f"hello from {stem}"},
+                                {"role": "assistant", "content": "hi"}])
+    with open(chat_logic.details_path_for(path), "w") as f:
+        json.dump({"model_name": "m", "name": stem, "create_date": "2024-01-01 00:00:00"}, f)
+    old = time.time() - days_old * 86400
+    os.utime(path, (old, old))
+    return f"{stem}.jsonl"
+
+
+def archive(config):
+    result = []
+    chat_logic.archive_old_chats(config, on_done=result.append)
+    return result[0]
+
+
+def test_restored_chat_is_not_archived_again(history_env):
+    history_env.set_config("archive_after_days", 7)
+    filename = write_old_chat("chat_1000")
+    assert archive(history_env) == 1
+    assert not os.path.exists(os.path.join(chat_logic.HISTORY_DIR, filename))
+
+    with chat_logic._archive_lock:
+        chat_logic.restore_archived(filename)
+    assert chat_logic.read_conversation(filename)[0]["content"] == "hello from chat_1000"
+    assert archive(history_env) == 0
+
+
+def test_archived_chats_survive_a_deleted_index(history_env):
+    history_env.set_config("archive_after_days", 7)
+    filenames = [write_old_chat(f"chat_{1000 + n}") for n in range(3)]
+    assert archive(history_env) == 3
+
+    # index.db deleted: a new one is built from the files and the archive segments
+    chat_logic._history_index = None
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(chat_logic.HISTORY_INDEX_FILE + suffix):
+            os.remove(chat_logic.HISTORY_INDEX_FILE + suffix)
+    index = chat_logic.get_history_index()
+
+    chats = {chat["filename"]: chat for chat in index.page(0, 10)}
+    assert sorted(chats) == filenames
+    assert all(chat["archived"] and chat["message_count"] == 2 for chat in chats.values())
+    assert chats["chat_1001.jsonl"]["name"] == "chat_1001"
+    with chat_logic._archive_lock:
+        chat_logic.restore_archived("chat_1001.jsonl")
+    assert chat_logic.read_conversation("chat_1001.jsonl")[0]["content"] == "hello from chat_1001"
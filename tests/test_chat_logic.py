@@ -0,0 +1,42 @@
+import asyncio
+import os
+import chat_logic
+from chat_logic import ChatManager
+from ollama_client import create_client
+from request_executor import RequestExecutor
+from benchmarks.fake_ollama import FakeOllama
+
+
+def test_cancelled_reply_keeps_the_part_received(history_env):
+    server = FakeOllama(tokens_per_sec=20, latency=0.01, reply_tokens=200).start()
+    history_env.set_config("ollama_host", server.url)
+    history_env.set_config("model_name", "bench:1b")
+    outcome = []
+
+    async def run():
+        client = create_client(history_env)
+        chat_manager = ChatManager(server.url, "bench:1b", config=history_env, client=client,
+                                   executor=RequestExecutor())
+        stopped = asyncio.get_running_loop().create_future()
+        chat_manager.send_user_message(
+            "hello",
+            on_reply_ready=lambda reply: stopped.set_result(("reply", reply)),
+            on_error=lambda message: stopped.set_result(("error", message)),
+            on_cancelled=lambda partial: stopped.set_result(("cancel", partial))
+        )
+        await asyncio.sleep(0.5)
+        chat_manager.cancel_generation()
+        outcome.append(await stopped)
+        await client.close()
+        return chat_manager
+
+    try:
+        chat_manager = asyncio.run(run())
+    finally:
+        server.stop()
+
+    kind, partial = outcome[0]
+    assert kind == "cancel" and partial.startswith("lorem ipsum")
+    assert chat_manager.conversation_history[-1] == {"role": "assistant", "content": partial}
+    chat_logic.flush_pending_saves()
+    assert chat_logic.read_conversation(os.path.basename(chat_manager.current_history_file))[-1]["content"] == partial
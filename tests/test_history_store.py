@@ -0,0 +1,43 @@
+import json
+from history_store import HistoryStore
+
+
+def message(n):
+    return {"role": "user", "content": f"m{n}"}
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+def test_torn_last_line_then_append(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    store = HistoryStore(path, fsync_policy="never")
+    messages = [message(n) for n in range(5)]
+    store.sync(messages)
+    # A crash in the middle of writing message 5
+    with open(path, "a") as f:
+        f.write('{"i": 5, "m": {"role": "us')
+
+    store = HistoryStore(path, fsync_policy="never")
+    messages = store.load()
+    assert contents(messages) == ["m0", "m1", "m2", "m3", "m4"]
+    messages += [message(5), message(6)]
+    store.sync(messages)
+
+    assert contents(HistoryStore(path).load()) == ["m0", "m1", "m2", "m3", "m4", "m5", "m6"]
+
+
+def test_records_are_placed_by_index(tmp_path):
+    path = str(tmp_path / "chat.jsonl")
+    with open(path, "w") as f:
+        for index in (0, 1, 3):
+            f.write(json.dumps({"i": index, "m": message(index)}) + "\n")
+
+    store = HistoryStore(path, fsync_policy="never")
+    messages = store.load()
+    assert contents(messages) == ["m0", "m1", "m3"]
+    # The file is rewritten to match, so later syncs and loads agree on the indexes
+    messages.append(message(4))
+    store.sync(messages)
+    assert contents(HistoryStore(path).load()) == ["m0", "m1", "m3", "m4"]
@@ -1,6 +1,6 @@
 import json
 import os
-from debug import debug
+from debug import debug, warning
 
 class Themes:
     THEMES_DIRECTORY = "themes"
@@ -35,7 +35,7 @@ class Themes:
         theme_file = os.path.join(self.THEMES_DIRECTORY, f"{theme_name}.json")
 
         if not os.path.exists(theme_file):
-            debug(f"Theme file '{theme_file}' not found. Using default theme.")
+            warning("Theme file '%s' not found. Using default theme.", theme_file)
             return self.default_palette
 
         try:
@@ -44,7 +44,7 @@ class Themes:
                 self.validate_theme_json(theme_data)
                 self.current_theme = theme_data.get("palette", [])
         except (json.JSONDecodeError, KeyError, Exception) as e:
-            debug(f"Failed to load theme '{theme_name}': {e}. Using default theme.")
+            warning("Failed to load theme '%s': %s. Using default theme.", theme_name, e)
             return self.default_palette
 
     def _merge_palette(self):
@@ -61,15 +61,10 @@ class Themes:
             bg = theme_entry.get("background") or "default"
             attr = theme_entry.get("attributes", "")
 
-            # Update the palette entry
-            if name in palette_dict:
-                debug(f"Overwriting '{name}': {fg}, {bg}, {attr}")  # Debug log
-                palette_dict[name] = (name, fg, bg, attr)
-            else:
-                debug(f"Adding new palette entry: '{name}': {fg}, {bg}, {attr}")  # Debug log
-                palette_dict[name] = (name, fg, bg, attr)
+            # Update (or add) the palette entry
+            palette_dict[name] = (name, fg, bg, attr)
 
-        # Final merged palette
+        # Final merged palette; one line for the whole theme instead of one per entry
         merged_palette = list(palette_dict.values())
-        debug(f"Final palette: {merged_palette}")  # Debug log
+        debug("Palette: %d entries, %d from the theme", len(merged_palette), len(self.current_theme))
         return merged_palette
\ No newline at end of file
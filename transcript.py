@@ -0,0 +1,142 @@
+import urwid
+from collections import OrderedDict
+
+# Message widgets kept alive at once; the rest are rebuilt from their markup when scrolled to
+WIDGET_CACHE_SIZE = 200
+# Wrapped layouts remembered per message (one per terminal width seen)
+LAYOUT_CACHE_WIDTHS = 4
+
+
+class TranscriptText(urwid.Text):
+    """urwid.Text that keeps its wrapped layout for each width, so resizing back and forth doesn't re-wrap."""
+
+    def __init__(self, markup, *args, **kwargs):
+        self._layouts = OrderedDict()
+        super().__init__(markup, *args, **kwargs)
+
+    def _invalidate(self):
+        # Text changed: every cached layout is stale
+        self._layouts = OrderedDict()
+        super()._invalidate()
+
+    def get_line_translation(self, maxcol, ta=None):
+        layout = self._layouts.get(maxcol)
+        if layout is None:
+            layout = super().get_line_translation(maxcol, ta)
+            self._layouts[maxcol] = layout
+            if len(self._layouts) > LAYOUT_CACHE_WIDTHS:
+                self._layouts.popitem(last=False)
+        return layout
+
+
+class ColumnMarkup(list):
+    """Markup of a transcript entry shown as side-by-side columns (one markup per column)."""
+
+
+class TranscriptEntry:
+    """Handle to one transcript message; set_text() updates it like an urwid.Text placeholder."""
+
+    def __init__(self, walker, position):
+        self.walker = walker
+        self.position = position
+
+    def set_text(self, markup):
+        self.walker.set_markup(self.position, markup)
+
+    def set_column(self, column, markup):
+        """Update one column of a ColumnMarkup entry."""
+        self.walker.set_column_markup(self.position, column, markup)
+
+
+class TranscriptWalker(urwid.ListWalker):
+    """
+    ListWalker over the chat messages that only builds widgets for the
+    positions the ListBox actually asks for (the visible window and its
+    neighbours). Messages are stored as plain markup; built widgets are kept
+    in a small LRU cache.
+    """
+
+    def __init__(self, cache_size=WIDGET_CACHE_SIZE):
+        self.entries = []        # (markup, spacer) per message
+        self.focus = 0
+        self.cache_size = cache_size
+        self._widgets = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, markup, spacer=True):
+        """Add a message (preceded by a divider if spacer is set) and return its handle."""
+        self.entries.append((markup, spacer))
+        self._modified()
+        return TranscriptEntry(self, len(self.entries) - 1)
+
+    def extend(self, items):
+        """Add many (markup, spacer) messages at once, e.g. a resumed conversation."""
+        self.entries.extend(items)
+        self._modified()
+
+    def set_markup(self, position, markup):
+        spacer = self.entries[position][1]
+        self.entries[position] = (markup, spacer)
+        widget = self._widgets.get(position)
+        if widget is not None:
+            if isinstance(markup, ColumnMarkup):
+                for text, column_markup in zip(widget.text_widget, markup):
+                    text.set_text(column_markup)
+            else:
+                widget.text_widget.set_text(markup)
+        self._modified()
+
+    def set_column_markup(self, position, column, markup):
+        self.entries[position][0][column] = markup
+        widget = self._widgets.get(position)
+        if widget is not None:
+            widget.text_widget[column].set_text(markup)
+        self._modified()
+
+    def _build(self, position):
+        markup, spacer = self.entries[position]
+        if isinstance(markup, ColumnMarkup):
+            # text_widget is then the list of column texts
+            text_widgets = [TranscriptText(m) for m in markup]
+            text = urwid.Columns(text_widgets, dividechars=2)
+        else:
+            text = text_widgets = TranscriptText(markup)
+        if spacer:
+            widget = urwid.Pile([urwid.AttrMap(urwid.Divider("-"), "divider"), text])
+        else:
+            widget = urwid.Pile([text])
+        widget = urwid.AttrMap(widget, "normal_text")
+        widget.text_widget = text_widgets
+        return widget
+
+    def _widget(self, position):
+        widget = self._widgets.get(position)
+        if widget is None:
+            widget = self._build(position)
+            self._widgets[position] = widget
+            if len(self._widgets) > self.cache_size:
+                self._widgets.popitem(last=False)
+        else:
+            self._widgets.move_to_end(position)
+        return widget
+
+    def get_focus(self):
+        if not self.entries:
+            return None, None
+        return self._widget(self.focus), self.focus
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def get_next(self, position):
+        if position + 1 >= len(self.entries):
+            return None, None
+        return self._widget(position + 1), position + 1
+
+    def get_prev(self, position):
+        if position <= 0:
+            return None, None
+        return self._widget(position - 1), position - 1
@@ -18,3 +18,23 @@ class CustomEdit(urwid.Edit):
 
     def set_message_handler(self, handler):
         self.message_handler = handler
+
+
+class SessionBar(urwid.Text):
+    """One line listing the open chats with the state of each, the current one highlighted."""
+
+    # Suffix shown after a chat's label for each state
+    STATE_MARKS = {
+        "queued": " (queued)",
+        "generating": " (typing)",
+        "unread": " (new)",
+        "error": " (error)"
+    }
+
+    def update(self, sessions, current):
+        """sessions: list of (label, state) tuples; current: index of the chat on screen."""
+        markup = []
+        for i, (label, state) in enumerate(sessions):
+            text = f" {i + 1}:{label}{self.STATE_MARKS.get(state, '')} "
+            markup.append(('focus_linebox_border', f"[{text}]") if i == current else ('normal_content', text))
+        self.set_text(markup)